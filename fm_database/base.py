@@ -1,45 +1,246 @@
 # -*- coding: utf-8 -*-
 """Database base configuration."""
-from contextlib import contextmanager
+import atexit
+import os
+import threading
+import time
+from contextlib import asynccontextmanager, contextmanager, nullcontext
 
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, inspect, text
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import scoped_session, sessionmaker
 
+from .pool import (
+    PoolStatistics,
+    TimedQueuePool,
+    get_async_engine_options,
+    get_engine_options,
+    get_pool_status,
+)
+from .querystats import QueryStatistics, query_budget
 from .settings import get_config
 
 Base = declarative_base()
 
 
-def get_engine():
-    """Return the sqlalchemy engine."""
-    config = get_config()
-    engine = create_engine(config.SQLALCHEMY_DATABASE_URI)
-    return engine
+class _RegistryEntry:  # pylint: disable=too-few-public-methods
+    """The engine and session factories shared by one process for one config."""
 
+    def __init__(self, engine, config):
+        """Create the entry."""
+        self.pid = os.getpid()
+        self.engine = engine
+        self.statistics = PoolStatistics()
+        self.statistics.attach(self.sync_engine)
+        if isinstance(self.sync_engine.pool, TimedQueuePool):
+            self.sync_engine.pool.statistics = self.statistics
+        self.query_statistics = None
+        if config.QUERY_STATS or config.SLOW_QUERY_SECONDS is not None:
+            self.query_statistics = QueryStatistics(config.SLOW_QUERY_SECONDS)
+            self.query_statistics.attach(self.sync_engine)
+            if config.QUERY_STATS_FILE:
+                atexit.register(self._dump_query_statistics, config.QUERY_STATS_FILE)
+        self.session_factory = sessionmaker(bind=engine)
+        self.db_session = scoped_session(self.session_factory)
 
-def get_session():
-    """Return the sqlalchemy db_session."""
-    engine = get_engine()
-    session = sessionmaker(bind=engine)
-    db_session = scoped_session(session)
+    @property
+    def sync_engine(self):
+        """Return the engine that owns the connection pool."""
+        return self.engine
+
+    def reset_after_fork(self):
+        """Drop the connections and sessions inherited from the parent process.
+
+        The parent's pooled connections are dereferenced rather than closed so
+        that the parent can keep using them.
+        """
+        self.sync_engine.pool = self.sync_engine.pool.recreate()
+        if self.db_session is not None:
+            self.db_session.registry.clear()
+        self.statistics.reset()
+        if self.query_statistics is not None:
+            self.query_statistics.reset()
+        self.pid = os.getpid()
+
+    def _dump_query_statistics(self, path):
+        """Add the statement statistics of this process to the file."""
+        # a forked child inherits the handler but only dumps its own counters
+        if self.query_statistics.as_dict():
+            self.query_statistics.dump(path)
+
+
+class _AsyncRegistryEntry(_RegistryEntry):  # pylint: disable=too-few-public-methods
+    """The asyncio engine and session factory shared by one process for one config.
+
+    The pool of an AsyncEngine belongs to the event loop that first uses it.
+    """
+
+    def __init__(self, engine, config):
+        """Create the entry."""
+        super().__init__(engine, config)
+        self.session_factory = sessionmaker(
+            bind=engine, class_=AsyncSession, expire_on_commit=False
+        )
+        self.db_session = None
+
+    @property
+    def sync_engine(self):
+        """Return the engine that owns the connection pool."""
+        return self.engine.sync_engine
+
+
+_registry = {}
+_async_registry = {}
+_registry_lock = threading.Lock()
+
+
+def get_async_database_uri(config):
+    """Return the asyncio database URI for a config.
+
+    Unless the config sets SQLALCHEMY_ASYNC_DATABASE_URI, the driver of
+    SQLALCHEMY_DATABASE_URI is swapped for asyncpg or aiosqlite.
+    """
+    if config.SQLALCHEMY_ASYNC_DATABASE_URI:
+        return config.SQLALCHEMY_ASYNC_DATABASE_URI
+
+    url = make_url(config.SQLALCHEMY_DATABASE_URI)
+    drivers = {"postgresql": "postgresql+asyncpg", "sqlite": "sqlite+aiosqlite"}
+    backend = url.get_backend_name()
+    if backend not in drivers:
+        raise ValueError(f"No asyncio driver known for '{backend}'")
+    return str(url.set(drivername=drivers[backend]))
+
+
+def _registry_key(uri, options):
+    """Return the registry key of an engine."""
+    return (uri, repr(options))
+
+
+def _get_registry_entry(config=None, is_async=False):
+    """Return the registry entry for the config, creating it if needed."""
+    if config is None:
+        config = get_config()
+    if is_async:
+        registry, entry_class, engine_factory = (
+            _async_registry,
+            _AsyncRegistryEntry,
+            create_async_engine,
+        )
+        uri = get_async_database_uri(config)
+        options = get_async_engine_options(config)
+    else:
+        registry, entry_class, engine_factory = _registry, _RegistryEntry, create_engine
+        uri = config.SQLALCHEMY_DATABASE_URI
+        options = get_engine_options(config)
+    key = _registry_key(uri, options)
+
+    with _registry_lock:
+        entry = registry.get(key)
+        if entry is None:
+            entry = entry_class(engine_factory(uri, **options), config)
+            registry[key] = entry
+        elif entry.pid != os.getpid():
+            entry.reset_after_fork()
+    return entry
+
+
+def get_engine(config=None):
+    """Return the sqlalchemy engine.
+
+    The engine is created once per process for each config and reused after that.
+    """
+    return _get_registry_entry(config).engine
+
+
+def get_session(config=None):
+    """Return the sqlalchemy db_session.
+
+    This is a thread local scoped_session shared by the whole process.
+    """
+    return _get_registry_entry(config).db_session
+
+
+def get_async_engine(config=None):
+    """Return the sqlalchemy AsyncEngine.
+
+    The engine is created once per process for each config and reused after that.
+    """
+    return _get_registry_entry(config, is_async=True).engine
+
+
+def pool_status(config=None, is_async=False):
+    """Return the live connection pool counters of the engine for the config."""
+    entry = _get_registry_entry(config, is_async=is_async)
+    return get_pool_status(entry.sync_engine, entry.statistics)
+
+
+def query_statistics(config=None, is_async=False):
+    """Return the statement statistics of the engine for the config.
+
+    Returns None unless the config sets QUERY_STATS or SLOW_QUERY_SECONDS.
+    """
+    return _get_registry_entry(config, is_async=is_async).query_statistics
+
+
+def dispose_engines():
+    """Close all pooled connections and empty the engine registry."""
+    with _registry_lock:
+        for entry in _registry.values():
+            entry.db_session.remove()
+            entry.engine.dispose()
+        _registry.clear()
+
+
+def dispose_engine(config=None):
+    """Close the pooled connections of the engine for the config and forget it.
 
-    return db_session
+    The engines of other configs are left as they are.
+    """
+    if config is None:
+        config = get_config()
+    key = _registry_key(config.SQLALCHEMY_DATABASE_URI, get_engine_options(config))
+    with _registry_lock:
+        entry = _registry.pop(key, None)
+    if entry is not None:
+        entry.db_session.remove()
+        entry.engine.dispose()
+
+
+async def dispose_async_engines():
+    """Close all pooled asyncio connections and empty the asyncio engine registry."""
+    with _registry_lock:
+        entries = list(_async_registry.values())
+        _async_registry.clear()
+    for entry in entries:
+        await entry.engine.dispose()
 
 
 @contextmanager
-def session_scope():
+def session_scope(max_queries=None):
     """Provide a transactional scope for a session around a series of operations.
 
+    Each scope gets its own session from the pooled engine of the process.
+    If the scope executes more than max_queries statements a warning is
+    logged. max_queries defaults to SESSION_QUERY_BUDGET of the config.
+
     Example usage:
     'with session_scope() as session:
         do session related work.
         make sure to commit the session if needed.
     """
 
-    session = get_session()
+    if max_queries is None:
+        max_queries = get_config().SESSION_QUERY_BUDGET
+    entry = _get_registry_entry()
+    budget = nullcontext()
+    if max_queries is not None:
+        budget = query_budget(max_queries, entry.engine, "session scope")
+    session = entry.session_factory()
     try:
-        yield session
+        with budget:
+            yield session
     except Exception as ex:  # noqa B902
         session.rollback()
         raise ex
@@ -47,6 +248,41 @@ def session_scope():
         session.close()
 
 
+@asynccontextmanager
+async def async_session_scope():
+    """Provide a transactional scope for an AsyncSession around a series of operations.
+
+    Objects are not expired on commit, so their attributes stay readable
+    without lazy loading from the event loop.
+
+    Example usage:
+    'async with async_session_scope() as session:
+        do session related work.
+        make sure to await session.commit() if needed.
+    """
+
+    session = _get_registry_entry(is_async=True).session_factory()
+    try:
+        yield session
+    except Exception as ex:  # noqa B902
+        await session.rollback()
+        raise ex
+    finally:
+        await session.close()
+
+
+class _QueryProperty:  # pylint: disable=too-few-public-methods
+    """A query property that gets the process wide session on first use.
+
+    The engine and session are only created when a model is first queried,
+    not when the models are imported.
+    """
+
+    def __get__(self, instance, owner):
+        """Return a query of the model."""
+        return get_session().query_property().__get__(instance, owner)
+
+
 def get_base(with_query=False):
     """
     Return the sqlalchemy base.
@@ -55,8 +291,7 @@ def get_base(with_query=False):
     """
     if with_query:
         # Adds Query Property to Models - enables `User.query.query_method()`
-        db_session = get_session()
-        Base.query = db_session.query_property()
+        Base.query = _QueryProperty()
     return Base
 
 
@@ -72,3 +307,68 @@ def drop_all_tables():
     engine = get_engine()
     base = get_base()
     base.metadata.drop_all(bind=engine)
+
+
+def _with_dependents(tables, table_names):
+    """Return the tables with the names and every table that refers to them."""
+    selected = set(table_names)
+    for table in tables:
+        # tables are sorted by dependency, so referred tables come first
+        if any(fk.column.table.name in selected for fk in table.foreign_keys):
+            selected.add(table.name)
+    return [table for table in tables if table.name in selected]
+
+
+def truncate_tables(table_names=None, engine=None):
+    """Delete all rows from the tables and reset their id sequences.
+
+    Postgres uses TRUNCATE ... RESTART IDENTITY CASCADE, which skips the row
+    by row work and WAL of a DELETE. Other databases use DELETE and on
+    SQLite the AUTOINCREMENT counters are reset. If table_names is given only
+    those tables are emptied, along with the tables that refer to them.
+    Returns (table name, seconds) for each table in the order they were
+    emptied. The engine defaults to the engine of the configured database.
+    """
+    base = get_base()
+    tables = base.metadata.sorted_tables
+    if table_names:
+        unknown = set(table_names) - set(base.metadata.tables)
+        if unknown:
+            raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+        tables = _with_dependents(tables, table_names)
+
+    engine = engine or get_engine()
+    dialect_name = engine.dialect.name
+    preparer = engine.dialect.identifier_preparer
+    timings = []
+    with engine.begin() as connection:
+        has_sequences = dialect_name == "sqlite" and inspect(connection).has_table(
+            "sqlite_sequence"
+        )
+        for table in reversed(tables):
+            start = time.perf_counter()
+            if dialect_name == "postgresql":
+                connection.execute(
+                    text(
+                        f"TRUNCATE TABLE {preparer.format_table(table)} "
+                        "RESTART IDENTITY CASCADE"
+                    )
+                )
+            else:
+                connection.execute(table.delete())
+                if has_sequences:
+                    connection.execute(
+                        text("DELETE FROM sqlite_sequence WHERE name = :name"),
+                        {"name": table.name},
+                    )
+            timings.append((table.name, time.perf_counter() - start))
+    return timings
+
+
+def vacuum_database():
+    """Run VACUUM to return the space of deleted rows to the file system on SQLite."""
+    engine = get_engine()
+    if engine.dialect.name != "sqlite":
+        raise NotImplementedError("VACUUM is only run on SQLite")
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        conn.execute(text("VACUUM"))
@@ -0,0 +1,218 @@
+# -*- coding: utf-8 -*-
+"""Process level cache of records looked up by primary key."""
+import threading
+import time
+from collections import OrderedDict
+
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, make_transient_to_detached
+from sqlalchemy.orm.attributes import set_committed_value
+
+from .settings import get_config
+
+# set in Session.info while the transaction has written rows that are not
+# committed yet. Records loaded in such a transaction are not cached.
+_WRITES_KEY = "identity_cache_writes"
+
+_lock = threading.Lock()
+_cache = None
+_configured = False
+
+
+class IdentityCache:
+    """A thread safe LRU cache of column values.
+
+    Keys are (table name, identity, database URL) as returned by cache_key,
+    so engines on different databases do not share entries. Entries expire
+    ttl seconds after they were stored. The column values are cached rather
+    than instances so that every session gets its own instance.
+    """
+
+    def __init__(self, maxsize=1024, ttl=60):
+        """Create the cache."""
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Return the cached column values for the key, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def set(self, key, values, generation):
+        """Store the column values for the key.
+
+        generation is the value of self.generation from before the values were
+        loaded. The values are not stored if anything was invalidated since,
+        as they may already be stale.
+        """
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + self.ttl, values)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def invalidate(self, key):
+        """Remove the entry for the key."""
+        with self._lock:
+            self.generation += 1
+            self._entries.pop(key, None)
+
+    def invalidate_record(self, tablename, identity):
+        """Remove the entries of a record on every database.
+
+        A database can be reached through engines with different URLs, like
+        the sync and asyncio drivers, so the record is removed for all.
+        """
+        with self._lock:
+            self.generation += 1
+            for key in [
+                key for key in self._entries if key[:2] == (tablename, identity)
+            ]:
+                del self._entries[key]
+
+    def invalidate_table(self, tablename):
+        """Remove every entry of a table."""
+        with self._lock:
+            self.generation += 1
+            for key in [key for key in self._entries if key[0] == tablename]:
+                del self._entries[key]
+
+    def clear(self):
+        """Remove every entry and reset the counters."""
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        """Return the size and hit/miss counters of the cache."""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "maxsize": self.maxsize,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": self.hits / lookups if lookups else 0.0,
+            }
+
+
+def configure_identity_cache(maxsize, ttl=60):
+    """Replace the identity cache of the process. A maxsize of 0 disables it.
+
+    Returns the new cache, or None if it is disabled.
+    """
+    global _cache, _configured  # pylint: disable=global-statement
+    with _lock:
+        _cache = IdentityCache(maxsize, ttl) if maxsize else None
+        _configured = True
+        return _cache
+
+
+def get_identity_cache():
+    """Return the identity cache of the process, or None if it is disabled.
+
+    It is created from the IDENTITY_CACHE_* config options on first use.
+    """
+    if not _configured:
+        config = get_config()
+        configure_identity_cache(config.IDENTITY_CACHE_SIZE, config.IDENTITY_CACHE_TTL)
+    return _cache
+
+
+def cache_key(session, model, identity):
+    """Return the cache key of a record loaded through the session."""
+    url = session.get_bind(model).engine.url
+    return (model.__table__.name, tuple(identity), url)
+
+
+def get_cached(session, model, record_id):
+    """Return the model instance with the record_id from the session or cache.
+
+    Instances already in the session are returned as they are. Otherwise the
+    record is loaded with session.query().get() on a miss and its column
+    values are cached for other sessions.
+    """
+    cache = get_identity_cache()
+    if cache is None:
+        return session.query(model).get(record_id)
+
+    instance = session.identity_map.get(session.identity_key(model, record_id))
+    if instance is not None:
+        return instance
+
+    key = cache_key(session, model, (record_id,))
+    values = cache.get(key)
+    if values is not None:
+        instance = model.__mapper__.class_manager.new_instance()
+        for name, value in values.items():
+            set_committed_value(instance, name, value)
+        make_transient_to_detached(instance)
+        session.add(instance)
+        return instance
+
+    generation = cache.generation
+    instance = session.query(model).get(record_id)
+    if instance is not None and not session.info.get(_WRITES_KEY):
+        state = inspect(instance)
+        values = {
+            attr.key: state.dict[attr.key]
+            for attr in model.__mapper__.column_attrs
+            if attr.key in state.dict
+        }
+        cache.set(key, values, generation)
+    return instance
+
+
+def invalidate_instance(instance):
+    """Remove a persistent instance from the cache."""
+    cache = get_identity_cache()
+    identity = inspect(instance).identity
+    if cache is not None and identity is not None:
+        cache.invalidate_record(instance.__table__.name, tuple(identity))
+
+
+@event.listens_for(Session, "after_flush")
+def _invalidate_flushed(session, flush_context):  # pylint: disable=unused-argument
+    """Remove the instances changed or deleted by a flush from the cache."""
+    if get_identity_cache() is None:
+        return
+    session.info[_WRITES_KEY] = True
+    for instance in list(session.dirty) + list(session.deleted):
+        invalidate_instance(instance)
+
+
+@event.listens_for(Session, "do_orm_execute")
+def _invalidate_statement(orm_execute_state):
+    """Remove every record of a table written by an INSERT, UPDATE or DELETE."""
+    cache = get_identity_cache()
+    if cache is None or orm_execute_state.is_select:
+        return
+    table = getattr(orm_execute_state.statement, "table", None)
+    if table is not None:
+        orm_execute_state.session.info[_WRITES_KEY] = True
+        cache.invalidate_table(table.name)
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _end_writes(session, transaction):
+    """Allow caching again once the transaction has ended."""
+    if transaction.parent is None:
+        session.info.pop(_WRITES_KEY, None)
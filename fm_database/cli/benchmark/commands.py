@@ -0,0 +1,311 @@
+# -*- coding: utf-8 -*-
+"""Click commands for benchmarks."""
+import datetime as dt
+import gc
+import pickle
+import time
+import timeit
+import tracemalloc
+from functools import partial
+
+import click
+from sqlalchemy import create_engine, delete
+from sqlalchemy.orm import Session
+
+from fm_database.cli.benchmark.suite import (
+    DEFAULT_SIZES,
+    create_topology,
+    find_regressions,
+    load_baseline,
+    run_suite,
+    save_baseline,
+)
+from fm_database.codecs import CODECS, COMPRESSIONS, decode_payload, encode_payload
+from fm_database.models.device import load_device_tree
+from fm_database.models.message import Message
+from fm_database.models.snapshot import load_device_snapshots
+
+
+@click.group()
+def benchmark():
+    """Command group for benchmark commands."""
+
+
+def _sample_payloads():
+    """Return a small and a large message payload like the devices send."""
+    now = dt.datetime(2021, 1, 1).isoformat()
+    small = {"device_id": "device1", "bus_number": 1, "time": now, "value": 21.5}
+    large = {
+        "device_id": "device1",
+        "time": now,
+        "sensors": [
+            {"cable": cable, "sensor": sensor, "value": 20.0 + sensor / 10}
+            for cable in range(10)
+            for sensor in range(20)
+        ],
+    }
+    return {"small": small, "large": large}
+
+
+def _time_per_second(function, number):
+    """Return how many times per second the function runs."""
+    return number / timeit.timeit(function, number=number)
+
+
+def benchmark_codecs(number=2000, threshold=256):
+    """Time encode and decode of each codec and compression.
+
+    Returns rows of (payload, codec, compression, encode/s, decode/s, bytes).
+    Pickle is included as the reference.
+    """
+    rows = []
+    for name, payload in _sample_payloads().items():
+        data = pickle.dumps(payload)
+        rows.append(
+            (
+                name,
+                "pickle",
+                None,
+                _time_per_second(partial(pickle.dumps, payload), number),
+                _time_per_second(partial(pickle.loads, data), number),
+                len(data),
+            )
+        )
+        for codec in CODECS:
+            for compression in COMPRESSIONS:
+                try:
+                    data = encode_payload(payload, codec, compression, threshold)
+                except RuntimeError as ex:
+                    click.echo(f"skipping {codec}/{compression}: {ex}")
+                    continue
+                rows.append(
+                    (
+                        name,
+                        codec,
+                        compression,
+                        _time_per_second(
+                            partial(
+                                encode_payload, payload, codec, compression, threshold
+                            ),
+                            number,
+                        ),
+                        _time_per_second(partial(decode_payload, data), number),
+                        len(data),
+                    )
+                )
+    return rows
+
+
+@benchmark.command()
+@click.option("-n", "--number", default=2000, help="Iterations per measurement")
+@click.option("-t", "--threshold", default=256, help="Compression threshold in bytes")
+def codecs(number, threshold):
+    """Compare message payload codecs by speed and stored size."""
+
+    click.echo(
+        f"{'payload':8} {'codec':8} {'compress':8} "
+        f"{'encode/s':>12} {'decode/s':>12} {'bytes':>8}"
+    )
+    for name, codec, compression, encode, decode, size in benchmark_codecs(
+        number, threshold
+    ):
+        click.echo(
+            f"{name:8} {codec:8} {str(compression):8} "
+            f"{encode:12.0f} {decode:12.0f} {size:8d}"
+        )
+
+
+def _measure_loader(loader, engine, device_ids):
+    """Return the seconds to load and the bytes held by the loaded objects."""
+    with Session(bind=engine) as session:
+        start = time.perf_counter()
+        loader(session, device_ids)
+        elapsed = time.perf_counter() - start
+
+    with Session(bind=engine) as session:
+        gc.collect()
+        tracemalloc.start()
+        result = loader(session, device_ids)
+        size, _ = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del result
+    return elapsed, size
+
+
+def benchmark_snapshots(sensors=100000):
+    """Compare loading the device topology as ORM instances and as snapshots.
+
+    The topology is created in an in-memory SQLite database. Returns rows of
+    (loader, seconds, bytes).
+    """
+    engine = create_engine("sqlite://")
+    device_ids = create_topology(engine, sensors)
+    rows = [
+        (name, *_measure_loader(loader, engine, device_ids))
+        for name, loader in (
+            ("orm", load_device_tree),
+            ("snapshot", load_device_snapshots),
+        )
+    ]
+    engine.dispose()
+    return rows
+
+
+@benchmark.command()
+@click.option("-s", "--sensors", default=100000, help="Number of sensors to load")
+def snapshots(sensors):
+    """Compare ORM instances and snapshots of the device topology."""
+
+    click.echo(f"{'loader':8} {'seconds':>10} {'MB':>10}")
+    for name, elapsed, size in benchmark_snapshots(sensors):
+        click.echo(f"{name:8} {elapsed:10.3f} {size / 1024 / 1024:10.1f}")
+
+
+def _message_rows(count):
+    """Yield rows of benchmark messages."""
+    now = dt.datetime.now()
+    for n in range(count):
+        yield {
+            "source": "benchmark",
+            "destination": "device1",
+            "classification": "reading",
+            "created_at": now,
+            "valid_from": now,
+            "valid_to": now + dt.timedelta(days=1),
+            "payload": {"n": n, "value": 21.5},
+        }
+
+
+def benchmark_bulk_load(rows=100000, batch_size=1000, uri="sqlite://"):
+    """Time loading messages with executemany and, on Postgres, with COPY.
+
+    The message table of the database at uri is dropped and recreated, so it
+    must be a scratch database. Returns rows of (path, rows per second). The
+    copy path is only timed with Postgres and psycopg2, everywhere else
+    bulk_copy would time the same executemany as bulk_create.
+    """
+    engine = create_engine(uri)
+    table = Message.__table__
+    loaders = [("executemany", Message.bulk_create)]
+    if engine.dialect.driver == "psycopg2":
+        loaders.append(("copy", Message.bulk_copy))
+    results = []
+    try:
+        table.drop(engine, checkfirst=True)
+        table.create(engine)
+        for name, loader in loaders:
+            with Session(bind=engine) as session:
+                start = time.perf_counter()
+                loader(session, _message_rows(rows), batch_size=batch_size)
+                results.append((name, rows / (time.perf_counter() - start)))
+                session.execute(delete(Message))
+                session.commit()
+        table.drop(engine)
+    finally:
+        engine.dispose()
+    return results
+
+
+@benchmark.command()
+@click.option("-r", "--rows", default=100000, help="Number of messages to load")
+@click.option("-b", "--batch-size", default=1000, help="Rows per executemany batch")
+@click.option(
+    "--postgres",
+    default=None,
+    help="Run against this Postgres URI instead of in-memory SQLite. "
+    "Its message table is dropped.",
+)
+@click.option(
+    "--confirm",
+    default=False,
+    is_flag=True,
+    help="Confirm dropping the message table of the --postgres database.",
+)
+def bulk_load(rows, batch_size, postgres, confirm):
+    """Compare bulk loading messages with executemany and COPY."""
+
+    if postgres and not confirm:
+        raise click.UsageError(
+            "--postgres drops the message table of the database, add --confirm"
+        )
+    if postgres:
+        click.echo(f"dropping and recreating the message table of {postgres}")
+    results = benchmark_bulk_load(rows, batch_size, postgres or "sqlite://")
+    click.echo(f"{'path':12} {'rows/s':>12}")
+    for name, rate in results:
+        click.echo(f"{name:12} {rate:12.0f}")
+    if len(results) == 1:
+        click.echo("COPY needs Postgres with psycopg2, only executemany was timed")
+
+
+@benchmark.command()
+@click.option(
+    "-s",
+    "--size",
+    "sizes",
+    multiple=True,
+    type=click.IntRange(10, 1000000),
+    help=f"Rows in the database for each case. Repeatable. Default: {DEFAULT_SIZES}",
+)
+@click.option(
+    "--postgres",
+    default=None,
+    help="Also run against this Postgres URI. All its tables are dropped.",
+)
+@click.option(
+    "--confirm",
+    default=False,
+    is_flag=True,
+    help="Confirm dropping all tables of the --postgres database.",
+)
+@click.option("--baseline", default=None, help="JSON file of the baseline results")
+@click.option(
+    "--save-baseline",
+    "store",
+    default=False,
+    is_flag=True,
+    help="Store the results in the baseline file instead of comparing with it.",
+)
+@click.option(
+    "--tolerance",
+    default=0.25,
+    show_default=True,
+    help="Fraction of the baseline ops/s a case may lose before it fails.",
+)
+# pylint: disable=too-many-arguments
+def suite(sizes, postgres, confirm, baseline, store, tolerance):
+    """Time the model layer hot paths and compare them with a baseline."""
+
+    if store and baseline is None:
+        raise click.UsageError("--save-baseline needs --baseline")
+    if postgres and not confirm:
+        raise click.UsageError(
+            "--postgres drops all tables of the database, add --confirm"
+        )
+    uris = ["sqlite://"]
+    if postgres:
+        click.echo(f"dropping and recreating all tables of {postgres}")
+        uris.append(postgres)
+
+    results = {}
+    click.echo(f"{'case':34} {'ops/s':>10} {'p50 ms':>10} {'p99 ms':>10}")
+    for uri in uris:
+        for key, result in run_suite(uri, sizes or DEFAULT_SIZES).items():
+            results[key] = result
+            click.echo(
+                f"{key:34} {result['ops_per_sec']:10.0f} "
+                f"{result['p50'] * 1000:10.3f} {result['p99'] * 1000:10.3f}"
+            )
+
+    if baseline is None:
+        return
+    if store:
+        save_baseline(baseline, results)
+        click.echo(f"saved the baseline to {baseline}")
+        return
+    regressions = find_regressions(results, load_baseline(baseline), tolerance)
+    for key, rate, expected in regressions:
+        click.echo(f"regression {key}: {rate:.0f} ops/s, baseline {expected:.0f} ops/s")
+    if regressions:
+        raise click.exceptions.Exit(1)
+    click.echo("no regressions")
@@ -0,0 +1,296 @@
+# -*- coding: utf-8 -*-
+"""Benchmark suite for the model layer hot paths."""
+import json
+import random
+import statistics
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from fm_database.base import get_base, truncate_tables
+from fm_database.models.device import (
+    Device,
+    Grainbin,
+    TemperatureCable,
+    TemperatureSensor,
+    load_device_tree,
+)
+from fm_database.models.message import Message
+
+# import the remaining models so all tables are created
+# pylint: disable=unused-import
+from fm_database.models import rollup, system, user  # noqa: F401 isort:skip
+
+DEFAULT_SIZES = (1000, 10000)
+
+
+def create_topology(engine, sensors, bins=5, cables=10, sensors_per_cable=20):
+    """Insert devices with bins, cables and sensors and return the device ids."""
+    tables = [
+        model.__table__
+        for model in (Device, Grainbin, TemperatureCable, TemperatureSensor)
+    ]
+    get_base().metadata.create_all(engine, tables=tables)
+    per_device = bins * cables * sensors_per_cable
+    device_count = max(1, sensors // per_device)
+    with engine.begin() as connection:
+        connection.execute(
+            insert(Device.__table__),
+            [
+                {
+                    "id": device,
+                    "device_id": f"device{device}",
+                    "name": f"device{device}",
+                    "hardware_version": "1",
+                    "software_version": "1",
+                }
+                for device in range(1, device_count + 1)
+            ],
+        )
+        connection.execute(
+            insert(Grainbin.__table__),
+            [
+                {
+                    "id": grainbin,
+                    "device_id": grainbin // bins + 1,
+                    "name": f"bin{grainbin}",
+                    "bus_number": 0,
+                }
+                for grainbin in range(device_count * bins)
+            ],
+        )
+        connection.execute(
+            insert(TemperatureCable.__table__),
+            [
+                {"id": cable, "grainbin_id": cable // cables}
+                for cable in range(device_count * bins * cables)
+            ],
+        )
+        connection.execute(
+            insert(TemperatureSensor.__table__),
+            [
+                {"cable_id": sensor // sensors_per_cable, "last_value": 20.0}
+                for sensor in range(device_count * per_device)
+            ],
+        )
+    return list(range(1, device_count + 1))
+
+
+def _device_rows(count, prefix="device"):
+    """Yield rows of devices."""
+    for n in range(count):
+        yield {
+            "device_id": f"{prefix}{n}",
+            "name": f"{prefix}{n}",
+            "hardware_version": "1",
+            "software_version": "1",
+        }
+
+
+def _message_rows(count):
+    """Yield rows of messages that can be dequeued."""
+    for n in range(count):
+        yield {
+            "source": "benchmark",
+            "destination": "device1",
+            "classification": "reading",
+            "payload": {"n": n},
+        }
+
+
+def _load_devices(session, size):
+    """Insert size devices and return their ids."""
+    return Device.bulk_create(session, _device_rows(size), returning=True)
+
+
+def _case_create(session, size):
+    """Time Device.create."""
+    _load_devices(session, size)
+    return lambda n: Device.create(
+        session,
+        device_id=f"new{n}",
+        hardware_version="1",
+        software_version="1",
+    )
+
+
+def _case_save(session, size):
+    """Time saving a changed device."""
+    ids = _load_devices(session, size)
+
+    def operation(n):
+        device = session.query(Device).get(ids[n % len(ids)])
+        device.name = f"saved{n}"
+        device.save(session)
+
+    return operation
+
+
+def _case_update(session, size):
+    """Time Device.update."""
+    ids = _load_devices(session, size)
+    return lambda n: Device.get_by_id(ids[n % len(ids)], session).update(
+        session, name=f"updated{n}"
+    )
+
+
+def _case_delete(session, size):
+    """Time Device.delete."""
+    ids = _load_devices(session, size)
+    return lambda n: Device.get_by_id(ids[n], session).delete(session)
+
+
+def _case_get_by_id(session, size):
+    """Time SurrogatePK.get_by_id of records that are not in the session."""
+    ids = _load_devices(session, size)
+    rng = random.Random(0)
+
+    def operation(n):  # pylint: disable=unused-argument
+        session.expunge_all()
+        Device.get_by_id(rng.choice(ids), session)
+
+    return operation
+
+
+def _case_load_device_tree(session, size):
+    """Time load_device_tree of all devices, with size sensors or one device."""
+    device_ids = create_topology(session.get_bind(), size)
+
+    def operation(n):  # pylint: disable=unused-argument
+        session.expunge_all()
+        load_device_tree(session, device_ids)
+
+    return operation
+
+
+def _case_enqueue(session, size):
+    """Time Message.enqueue."""
+    Message.bulk_create(session, _message_rows(size))
+    return lambda n: Message.enqueue(
+        session, "benchmark", "device1", "reading", payload={"n": n}
+    )
+
+
+def _case_dequeue(session, size):
+    """Time Message.dequeue of 10 messages and their ack."""
+    Message.bulk_create(session, _message_rows(size))
+
+    def operation(n):  # pylint: disable=unused-argument
+        Message.ack(session, Message.dequeue(session, "device1", batch_size=10))
+
+    return operation
+
+
+def _case_delete_all_data(session, size):
+    """Time emptying all tables holding size messages and devices."""
+    engine = session.get_bind()
+
+    def operation(n):  # pylint: disable=unused-argument
+        truncate_tables(engine=engine)
+
+    def before(n):  # pylint: disable=unused-argument
+        Message.bulk_create(session, _message_rows(size))
+        _load_devices(session, size)
+        session.close()
+
+    operation.before = before
+    return operation
+
+
+# name -> (setup, operations per run). A setup prepares a fresh database
+# holding size rows and returns the operation, which is called with the
+# number of the run. There are at most size runs of a case. An operation
+# may have a before function that runs untimed before each call.
+CASES = {
+    "create": (_case_create, 200),
+    "save": (_case_save, 200),
+    "update": (_case_update, 200),
+    "delete": (_case_delete, 200),
+    "get_by_id": (_case_get_by_id, 500),
+    "load_device_tree": (_case_load_device_tree, 5),
+    "enqueue": (_case_enqueue, 200),
+    "dequeue": (_case_dequeue, 50),
+    "delete_all_data": (_case_delete_all_data, 3),
+}
+
+
+def _measure(operation, operations):
+    """Return ops/sec, p50 and p99 seconds of calling the operation."""
+    timings = []
+    before = getattr(operation, "before", None)
+    for n in range(operations):
+        if before is not None:
+            before(n)
+        start = time.perf_counter()
+        operation(n)
+        timings.append(time.perf_counter() - start)
+    cut_points = statistics.quantiles(timings, n=100, method="inclusive")
+    return {
+        "ops_per_sec": len(timings) / sum(timings),
+        "p50": cut_points[49],
+        "p99": cut_points[98],
+    }
+
+
+def run_suite(uri="sqlite://", sizes=DEFAULT_SIZES, cases=None):
+    """Run the benchmark cases for each size against a database.
+
+    Every case gets a freshly created schema, so the database must be a
+    scratch database. Returns a dict keyed by "backend:case:size" of
+    ops_per_sec, p50 and p99 in seconds.
+    """
+    engine = create_engine(uri)
+    metadata = get_base().metadata
+    make_session = sessionmaker(bind=engine)
+    results = {}
+    try:
+        for size in sizes:
+            for name in cases or CASES:
+                setup, operations = CASES[name]
+                metadata.drop_all(engine)
+                metadata.create_all(engine)
+                session = make_session()
+                try:
+                    operation = setup(session, size)
+                    result = _measure(operation, min(operations, size))
+                finally:
+                    session.close()
+                results[f"{engine.dialect.name}:{name}:{size}"] = result
+        metadata.drop_all(engine)
+    finally:
+        engine.dispose()
+    return results
+
+
+def load_baseline(path):
+    """Return the stored baseline results."""
+    with open(path, encoding="utf-8") as file:
+        return json.load(file)
+
+
+def save_baseline(path, results):
+    """Store results as the baseline, merged into an existing baseline."""
+    try:
+        baseline = load_baseline(path)
+    except FileNotFoundError:
+        baseline = {}
+    baseline.update(results)
+    with open(path, "w", encoding="utf-8") as file:
+        json.dump(baseline, file, indent=2, sort_keys=True)
+
+
+def find_regressions(results, baseline, tolerance=0.25):
+    """Return (key, ops/sec, baseline ops/sec) of results slower than the baseline.
+
+    A result regresses when its ops/sec is more than tolerance below the
+    baseline. Results without a baseline are ignored.
+    """
+    regressions = []
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        expected = baseline[key]["ops_per_sec"]
+        if result["ops_per_sec"] < expected * (1 - tolerance):
+            regressions.append((key, result["ops_per_sec"], expected))
+    return regressions
@@ -1,20 +1,46 @@
 # -*- coding: utf-8 -*-
 """Main command line interface entry point."""
+from importlib import import_module
+
 import click
 
-from .database import commands as database_commands
-from .database import update_commands
-from .testing import commands as testing_commands
 
+class LazyGroup(click.Group):
+    """A group that imports the module of a subcommand only when it is used.
 
-@click.group()
-def entry_point():
-    """Entry point for CLI."""
+    Subcommands are given as a mapping of command name to
+    'module:attribute'. Importing the models, alembic and sqlalchemy is
+    most of the start up time, so only the command that runs pays for it.
+    """
 
+    def __init__(self, *args, lazy_subcommands=None, **kwargs):
+        """Create the group."""
+        super().__init__(*args, **kwargs)
+        self.lazy_subcommands = lazy_subcommands or {}
 
-entry_point.add_command(testing_commands.test)
-entry_point.add_command(testing_commands.lint)
+    def list_commands(self, ctx):
+        """Return the names of the eager and lazy subcommands."""
+        return sorted([*super().list_commands(ctx), *self.lazy_subcommands])
 
-entry_point.add_command(update_commands.update)
+    def get_command(self, ctx, cmd_name):
+        """Return the subcommand, importing its module if needed."""
+        if cmd_name not in self.lazy_subcommands:
+            return super().get_command(ctx, cmd_name)
+        module_name, attribute = self.lazy_subcommands[cmd_name].split(":")
+        return getattr(import_module(module_name, __package__), attribute)
 
-entry_point.add_command(database_commands.create)
+
+@click.group(
+    cls=LazyGroup,
+    lazy_subcommands={
+        "test": ".testing.commands:test",
+        "lint": ".testing.commands:lint",
+        "update": ".database.update_commands:update",
+        "create": ".database.commands:create",
+        "benchmark": ".benchmark.commands:benchmark",
+        "export": ".transfer.commands:export",
+        "import": ".transfer.commands:import_",
+    },
+)
+def entry_point():
+    """Entry point for CLI."""
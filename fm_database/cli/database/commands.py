@@ -1,17 +1,36 @@
 # -*- coding: utf-8 -*-
 """Click commands for the database management."""
+import datetime as dt
+import time
+
 import click
-from alembic import command as al_command
-from alembic.config import Config as AlConfig
+from sqlalchemy import text
 
-from fm_database.base import create_all_tables, drop_all_tables, get_base, get_session
+from fm_database.base import (
+    create_all_tables,
+    drop_all_tables,
+    get_base,
+    get_engine,
+    pool_status,
+    session_scope,
+    truncate_tables,
+    vacuum_database,
+)
+from fm_database.indexes import (
+    HOT_FILTER_COLUMNS,
+    missing_filter_indexes,
+    missing_fk_indexes,
+    sequential_scans,
+)
 
 # import all models so they are available to the SqlAlchemy base
 # pylint: disable=unused-import
 from fm_database.models.device import Device  # noqa: F401
-from fm_database.models.message import Message  # noqa: F401
+from fm_database.models.message import Message
+from fm_database.models.rollup import refresh_rollups
 from fm_database.models.system import SystemSetup  # noqa: F401
 from fm_database.models.user import User  # noqa: F401
+from fm_database.querystats import QueryStatistics
 from fm_database.settings import get_config
 
 
@@ -27,7 +46,21 @@ def create():
     is_flag=True,
     help="Confirm this action. This will delete all previous database data.",
 )
-def delete_all_data(confirm):
+@click.option(
+    "-t",
+    "--table",
+    "tables",
+    multiple=True,
+    help="Only delete the data of this table and the tables that refer to it. "
+    "Repeatable.",
+)
+@click.option(
+    "--vacuum",
+    default=False,
+    is_flag=True,
+    help="Run VACUUM afterwards to shrink the database file. SQLite only.",
+)
+def delete_all_data(confirm, tables, vacuum):
     """Delete all data from the database."""
 
     if not confirm:
@@ -37,15 +70,190 @@ def delete_all_data(confirm):
     else:
         click.echo("deleting all data from the database.")
 
-        base = get_base()
-        session = get_session()
-        for table in reversed(base.metadata.sorted_tables):
-            session.execute(table.delete())
-        session.commit()
+        try:
+            timings = truncate_tables(tables)
+        except ValueError as ex:
+            raise click.BadParameter(str(ex), param_hint="--table") from ex
+        for table, elapsed in timings:
+            click.echo(f"  {table}: {elapsed:.3f}s")
+
+        if vacuum:
+            start = time.perf_counter()
+            try:
+                vacuum_database()
+            except NotImplementedError as ex:
+                click.echo(f"  skipping VACUUM: {ex}")
+            else:
+                click.echo(f"  VACUUM: {time.perf_counter() - start:.3f}s")
 
         click.echo("done")
 
 
+@create.command()
+def pool_stats():
+    """Show the connection pool profile and live pool counters."""
+
+    engine = get_engine()
+    with engine.connect() as connection:
+        for key, value in pool_status().items():
+            click.echo(f"{key}: {value}")
+
+        if engine.dialect.name == "postgresql":
+            click.echo("server connections to this database by state:")
+            result = connection.execute(
+                text(
+                    "SELECT coalesce(state, 'unknown'), count(*) FROM pg_stat_activity "
+                    "WHERE datname = current_database() GROUP BY 1 ORDER BY 1"
+                )
+            )
+            for state, count in result:
+                click.echo(f"  {state}: {count}")
+
+
+@create.command()
+@click.option(
+    "-f",
+    "--file",
+    "path",
+    default=None,
+    help="Statistics file to report. Defaults to QUERY_STATS_FILE of the config.",
+)
+@click.option("-n", "--number", default=20, show_default=True, help="Statements shown")
+@click.option(
+    "-s",
+    "--sort",
+    "order_by",
+    type=click.Choice(["total", "count", "avg", "p99", "rows"]),
+    default="total",
+    show_default=True,
+    help="Counter the statements are ranked by.",
+)
+def query_report(path, number, order_by):
+    """Report the statements that took the most time."""
+
+    path = path or get_config().QUERY_STATS_FILE
+    if path is None:
+        raise click.UsageError(
+            "No statistics file. Set QUERY_STATS and QUERY_STATS_FILE in the config "
+            "or pass --file."
+        )
+    statistics = QueryStatistics()
+    try:
+        statistics.load(path)
+    except FileNotFoundError as ex:
+        raise click.FileError(path, "no statistics have been written yet") from ex
+
+    click.echo(
+        f"{'count':>8} {'total s':>10} {'avg ms':>10} {'p99 ms':>10} {'rows':>10}"
+    )
+    for statement, counters in statistics.top(number, order_by):
+        click.echo(
+            f"{counters['count']:8d} {counters['total']:10.3f} "
+            f"{counters['avg'] * 1000:10.3f} {counters['p99'] * 1000:10.3f} "
+            f"{counters['rows']:10d}  {statement}"
+        )
+
+
+@create.command()
+@click.option(
+    "-c",
+    "--column",
+    "columns",
+    multiple=True,
+    help="Also check a 'table.column' that is used as a filter. Repeatable.",
+)
+def index_advisor(columns):
+    """Report foreign key and filter columns that have no index."""
+
+    metadata = get_base().metadata
+    try:
+        missing_filters = missing_filter_indexes(metadata, HOT_FILTER_COLUMNS + columns)
+    except ValueError as ex:
+        raise click.BadParameter(str(ex), param_hint="--column") from ex
+
+    missing = missing_fk_indexes(metadata)
+    click.echo(f"foreign keys without an index: {len(missing)}")
+    for table, fk_columns, referred in missing:
+        click.echo(f"  {table}({', '.join(fk_columns)}) -> {referred}")
+
+    click.echo(f"filter columns without an index: {len(missing_filters)}")
+    for name in missing_filters:
+        click.echo(f"  {name}")
+
+    with get_engine().connect() as connection:
+        scans = sequential_scans(connection)
+    if scans:
+        click.echo("tables with the most rows read by sequential scans:")
+        for table, seq_scan, seq_tup_read, idx_scan in scans:
+            click.echo(
+                f"  {table}: {seq_scan} seq scans read {seq_tup_read} rows, "
+                f"{idx_scan} index scans"
+            )
+
+
+@create.command()
+def rollup_readings():
+    """Roll up the sensor readings received since the last run."""
+
+    with session_scope() as session:
+        watermark = refresh_rollups(session)
+
+    if watermark is None:
+        click.echo("no new readings to roll up")
+    else:
+        click.echo(f"rolled up readings up to {watermark}")
+
+
+@create.command()
+@click.option(
+    "--older-than",
+    default=0,
+    show_default=True,
+    help="Only purge messages that expired more than this many days ago.",
+)
+@click.option(
+    "--batch-size",
+    default=1000,
+    show_default=True,
+    help="Number of messages deleted per transaction.",
+)
+@click.option(
+    "--max-batches",
+    default=None,
+    type=int,
+    help="Stop after this many batches. Purges everything by default.",
+)
+@click.option(
+    "--dry-run",
+    default=False,
+    is_flag=True,
+    help="Only report how many messages would be purged.",
+)
+def purge_messages(older_than, batch_size, max_batches, dry_run):
+    """Delete expired messages in batches."""
+
+    before = dt.datetime.now() - dt.timedelta(days=older_than)
+    with session_scope() as session:
+        start = time.perf_counter()
+        count = Message.purge_expired(
+            session,
+            before=before,
+            batch_size=batch_size,
+            max_batches=max_batches,
+            dry_run=dry_run,
+        )
+        elapsed = time.perf_counter() - start
+
+    if dry_run:
+        click.echo(f"{count} messages expired before {before} would be purged")
+    else:
+        rate = count / elapsed if elapsed else 0
+        click.echo(
+            f"purged {count} messages expired before {before} "
+            f"in {elapsed:.2f}s ({rate:.0f} messages/s)"
+        )
+
+
 @create.command()
 @click.pass_context
 def recreate_database(ctx):
@@ -59,6 +267,10 @@ def recreate_database(ctx):
 @create.command()
 def create_tables():
     """Create database tables."""
+    # alembic is only needed here, so the other commands do not import it
+    # pylint: disable=import-outside-toplevel
+    from alembic import command as al_command
+    from alembic.config import Config as AlConfig
 
     click.echo("creating all tables")
     create_all_tables()
@@ -35,7 +35,20 @@ TEST_PATH = os.path.join(PROJECT_ROOT, "tests")
     default=None,
     help="Run tests by name eg. 'test_get_by_id' or 'test_get_by_id or test_validate_success'",
 )
-def test(coverage, filename, function):
+@click.option(
+    "-n",
+    "--numprocesses",
+    default=None,
+    help="Run the tests in this many processes with pytest-xdist, or 'auto'",
+)
+@click.option(
+    "-m",
+    "--memory",
+    default=False,
+    is_flag=True,
+    help="Run the tests against an in-memory SQLite database",
+)
+def test(coverage, filename, function, numprocesses, memory):
     """Run the tests."""
     import pytest  # pylint: disable=import-outside-toplevel
 
@@ -45,6 +58,10 @@ def test(coverage, filename, function):
         pytest_args = [TEST_PATH, "--verbose"]
     if function:
         pytest_args.extend(["-k", function])
+    if numprocesses:
+        pytest_args.extend(["-n", numprocesses])
+    if memory:
+        pytest_args.append("--sqlite-memory")
     if coverage:
         pytest_args.extend(["--cov", HERE])
         pytest_args.extend(["--cov-report", "term-missing:skip-covered"])
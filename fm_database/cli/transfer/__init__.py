@@ -0,0 +1,2 @@
+# -*- coding: utf-8 -*-
+"""Command line interface for export and import commands."""
@@ -0,0 +1,104 @@
+# -*- coding: utf-8 -*-
+"""Click commands to export and import table data."""
+import os
+import time
+
+import click
+
+from fm_database.base import get_engine
+
+# import all models so they are available to the SqlAlchemy base
+# pylint: disable=unused-import
+from fm_database.models import device, message, rollup, system, user  # noqa: F401
+from fm_database.transfer import (
+    FORMATS,
+    export_table,
+    get_tables,
+    import_table,
+    table_path,
+)
+
+table_option = click.option(
+    "-t",
+    "--table",
+    "tables",
+    multiple=True,
+    help="Only this table. Repeatable. All tables by default.",
+)
+format_option = click.option(
+    "-f",
+    "--format",
+    "fmt",
+    type=click.Choice(FORMATS),
+    default="ndjson",
+    show_default=True,
+    help="File format.",
+)
+batch_size_option = click.option(
+    "-b",
+    "--batch-size",
+    default=1000,
+    show_default=True,
+    help="Rows read and written at a time.",
+)
+
+
+def _get_tables(tables):
+    """Return the tables to transfer, parents before children."""
+    try:
+        return get_tables(tables)
+    except ValueError as ex:
+        raise click.BadParameter(str(ex), param_hint="--table") from ex
+
+
+def _report(table, count, start):
+    """Echo the number of rows of a table and the rate they were transferred at."""
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed else 0
+    click.echo(f"  {table.name}: {count} rows in {elapsed:.2f}s ({rate:.0f} rows/s)")
+
+
+@click.command()
+@click.argument("directory", type=click.Path(file_okay=False))
+@table_option
+@format_option
+@batch_size_option
+def export(directory, tables, fmt, batch_size):
+    """Export tables to one file per table in DIRECTORY."""
+
+    tables = _get_tables(tables)
+    os.makedirs(directory, exist_ok=True)
+    engine = get_engine()
+    options = {}
+    if engine.dialect.name == "postgresql":
+        # one consistent snapshot of all tables
+        options["isolation_level"] = "REPEATABLE READ"
+    with engine.connect().execution_options(**options) as connection:
+        with connection.begin():
+            for table in tables:
+                start = time.perf_counter()
+                path = table_path(directory, table, fmt)
+                count = export_table(connection, table, path, fmt, batch_size)
+                _report(table, count, start)
+
+
+@click.command("import")
+@click.argument("directory", type=click.Path(exists=True, file_okay=False))
+@table_option
+@format_option
+@batch_size_option
+def import_(directory, tables, fmt, batch_size):
+    """Import the table files in DIRECTORY, parents before children.
+
+    Tables without a file are skipped. Everything is imported in one
+    transaction, so a failure leaves the database unchanged.
+    """
+
+    with get_engine().begin() as connection:
+        for table in _get_tables(tables):
+            path = table_path(directory, table, fmt)
+            if not os.path.exists(path):
+                continue
+            start = time.perf_counter()
+            count = import_table(connection, table, path, fmt, batch_size)
+            _report(table, count, start)
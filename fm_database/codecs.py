@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""Payload codecs and the column type that stores encoded payloads."""
+import datetime as dt
+import json
+import uuid
+import zlib
+
+from sqlalchemy import LargeBinary
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import TypeDecorator
+
+from .settings import get_config
+
+try:
+    import orjson  # type: ignore [import]
+except ImportError:  # pragma: no cover
+    orjson = None
+
+try:
+    import msgpack  # type: ignore [import]
+except ImportError:  # pragma: no cover
+    msgpack = None
+
+try:
+    import zstandard  # type: ignore [import]
+except ImportError:  # pragma: no cover
+    zstandard = None
+
+
+def json_serializer(value):
+    """Serialize a value to a JSON string for the engine's JSON types."""
+    return _json_dumps(value).decode()
+
+
+def json_deserializer(data):
+    """Deserialize a JSON string for the engine's JSON types."""
+    return _json_loads(data)
+
+
+def _json_default(value):
+    """Return a JSON value for the types orjson serializes natively.
+
+    Datetimes, dates and times become ISO 8601 strings and UUIDs strings,
+    so the output does not depend on orjson being installed.
+    """
+    if isinstance(value, (dt.datetime, dt.date, dt.time)):
+        return value.isoformat()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+def _json_dumps(value):
+    """Serialize a value to JSON bytes, with orjson when it is installed.
+
+    Both paths accept the same values: non-string dict keys are converted
+    to strings and the types of _json_default are serialized.
+    """
+    if orjson is not None:
+        return orjson.dumps(
+            value, default=_json_default, option=orjson.OPT_NON_STR_KEYS
+        )
+    return json.dumps(value, separators=(",", ":"), default=_json_default).encode()
+
+
+def _json_loads(data):
+    """Deserialize JSON bytes, with orjson when it is installed."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _msgpack_dumps(value):
+    """Serialize a value to msgpack bytes."""
+    if msgpack is None:
+        raise RuntimeError("The msgpack codec needs the 'msgpack' package")
+    return msgpack.packb(value, use_bin_type=True)
+
+
+def _msgpack_loads(data):
+    """Deserialize msgpack bytes."""
+    if msgpack is None:
+        raise RuntimeError("The msgpack codec needs the 'msgpack' package")
+    return msgpack.unpackb(data, raw=False)
+
+
+def _zstd_compress(data):
+    """Compress bytes with zstandard."""
+    if zstandard is None:
+        raise RuntimeError("zstd compression needs the 'zstandard' package")
+    return zstandard.ZstdCompressor().compress(data)
+
+
+def _zstd_decompress(data):
+    """Decompress zstandard bytes."""
+    if zstandard is None:
+        raise RuntimeError("zstd compression needs the 'zstandard' package")
+    return zstandard.ZstdDecompressor().decompress(data)
+
+
+# name -> (header id, encode, decode)
+CODECS = {
+    "json": (1, _json_dumps, _json_loads),
+    "msgpack": (2, _msgpack_dumps, _msgpack_loads),
+}
+
+# name -> (header id, compress, decompress)
+COMPRESSIONS = {
+    None: (0, None, None),
+    "zlib": (1, zlib.compress, zlib.decompress),
+    "zstd": (2, _zstd_compress, _zstd_decompress),
+}
+
+_CODECS_BY_ID = {codec[0]: codec for codec in CODECS.values()}
+_COMPRESSIONS_BY_ID = {
+    compression[0]: compression for compression in COMPRESSIONS.values()
+}
+
+
+def encode_payload(value, codec="json", compression=None, threshold=1024):
+    """Encode a value to bytes with a one byte header.
+
+    The high nibble of the header names the codec and the low nibble the
+    compression, so rows stay readable when the settings change. The data is
+    only compressed when the encoded value is at least threshold bytes long.
+    """
+    codec_id, dumps, _ = CODECS[codec]
+    compression_id, compress, _ = COMPRESSIONS[compression]
+    data = dumps(value)
+    if compress is None or len(data) < threshold:
+        compression_id = 0
+    else:
+        data = compress(data)
+    return bytes([codec_id << 4 | compression_id]) + data
+
+
+def decode_payload(data):
+    """Decode bytes created by encode_payload."""
+    header = data[0]
+    _, _, loads = _CODECS_BY_ID[header >> 4]
+    _, _, decompress = _COMPRESSIONS_BY_ID[header & 0x0F]
+    body = bytes(data[1:])
+    if decompress is not None:
+        body = decompress(body)
+    return loads(body)
+
+
+class PayloadType(TypeDecorator):  # pylint: disable=abstract-method
+    """Store a JSON or msgpack serializable value.
+
+    The value is stored as bytes from encode_payload. With jsonb=True it is
+    stored as JSONB on Postgres instead, so it can be queried and indexed.
+    Postgres compresses large JSONB values itself. The storage only depends
+    on jsonb, so the column keeps its type when the config changes. The
+    defaults come from the MESSAGE_PAYLOAD_* config options. A JSONB column
+    ignores the codec and compression on Postgres and uses them on other
+    databases, and a codec other than json can not be given for it.
+    """
+
+    impl = LargeBinary
+    cache_ok = True
+
+    def __init__(self, codec=None, compression="default", threshold=None, jsonb=False):
+        """Create the type."""
+        super().__init__()
+        config = get_config()
+        self.codec = codec or config.MESSAGE_PAYLOAD_CODEC
+        if compression == "default":
+            compression = config.MESSAGE_PAYLOAD_COMPRESSION
+        self.compression = compression
+        if threshold is None:
+            threshold = config.MESSAGE_PAYLOAD_COMPRESS_THRESHOLD
+        self.threshold = threshold
+        self.jsonb = jsonb
+        if jsonb and codec not in (None, "json"):
+            raise ValueError(f"The payload codec '{codec}' can not be stored as JSONB")
+        if self.codec not in CODECS:
+            raise ValueError(f"Unknown payload codec '{self.codec}'")
+        if self.compression not in COMPRESSIONS:
+            raise ValueError(f"Unknown payload compression '{self.compression}'")
+
+    def _is_jsonb(self, dialect):
+        """Return True if the value is stored as JSONB."""
+        return dialect.name == "postgresql" and self.jsonb
+
+    def load_dialect_impl(self, dialect):
+        """Return JSONB for jsonb columns on Postgres and bytes otherwise."""
+        if self._is_jsonb(dialect):
+            return dialect.type_descriptor(JSONB(none_as_null=True))
+        return dialect.type_descriptor(LargeBinary())
+
+    def process_bind_param(self, value, dialect):
+        """Encode the value."""
+        if value is None or self._is_jsonb(dialect):
+            return value
+        return encode_payload(value, self.codec, self.compression, self.threshold)
+
+    def process_result_value(self, value, dialect):
+        """Decode the value."""
+        if value is None or self._is_jsonb(dialect):
+            return value
+        return decode_payload(value)
@@ -1,11 +1,32 @@
 # -*- coding: utf-8 -*-
 """Database module, including the SQLAlchemy database object and DB-related utilities."""
-from sqlalchemy import Column, ForeignKey, Integer
+from itertools import islice
+
+from sqlalchemy import Column, ForeignKey, Integer, insert, inspect, select, tuple_
+from sqlalchemy.dialects import postgresql, sqlite
 
 from fm_database.base import get_base
+from fm_database.cache import get_cached, invalidate_instance
+from fm_database.pgcopy import copy_rows
 
 Base = get_base(with_query=True)
 
+UPSERT_DIALECTS = {"postgresql": postgresql.insert, "sqlite": sqlite.insert}
+
+# bound parameters allowed in one statement. SQLite before 3.32 allows 999
+# and the Postgres protocol 65535. Other dialects get DEFAULT_MAX_BIND_PARAMS
+MAX_BIND_PARAMS = {"postgresql": 32767, "sqlite": 999}
+DEFAULT_MAX_BIND_PARAMS = 1000
+
+
+def chunked(rows, size):
+    """Yield lists of at most size items from any iterable."""
+    iterator = iter(rows)
+    chunk = list(islice(iterator, size))
+    while chunk:
+        yield chunk
+        chunk = list(islice(iterator, size))
+
 
 class CRUDMixin:
     """Mixin that adds convenience methods for CRUD (create, read, update, delete) operations."""
@@ -18,12 +39,14 @@ class CRUDMixin:
 
     def update(self, session, commit=True, **kwargs):
         """Update specific fields of a record."""
+        invalidate_instance(self)
         for attr, value in kwargs.items():
             setattr(self, attr, value)
         return self.save(session) if commit else self
 
     def save(self, session, commit=True):
         """Save the record."""
+        invalidate_instance(self)
         session.add(self)
         if commit:
             session.commit()
@@ -31,9 +54,181 @@ class CRUDMixin:
 
     def delete(self, session, commit=True):
         """Remove the record from the database."""
+        invalidate_instance(self)
         session.delete(self)
         return commit and session.commit()
 
+    @classmethod
+    def bulk_create(cls, session, rows, commit=True, returning=False, batch_size=1000):
+        """Insert many records with one executemany statement per batch.
+
+        Rows are dictionaries of column values that all have the same keys.
+        They skip the model __init__, so only column defaults are applied.
+        If returning is True, the primary keys of the new records are returned
+        in the order of the rows.
+        """
+        statement = insert(cls.__table__)
+        primary_keys = []
+        for chunk in chunked(rows, batch_size):
+            if not returning:
+                session.execute(statement, chunk)
+            elif session.get_bind().dialect.insert_executemany_returning:
+                result = session.execute(statement.returning(*cls._pk_columns()), chunk)
+                primary_keys.extend(cls._pk_value(row) for row in result)
+            else:
+                # no executemany RETURNING on this dialect, so insert row by row
+                # inside the same transaction
+                for row in chunk:
+                    result = session.execute(statement, row)
+                    primary_keys.append(cls._pk_value(result.inserted_primary_key))
+        if commit:
+            session.commit()
+        return primary_keys if returning else None
+
+    @classmethod
+    def bulk_copy(cls, session, rows, commit=True, batch_size=1000):
+        """Load many records with COPY FROM STDIN on Postgres.
+
+        Rows are dictionaries of column values that all have the same keys.
+        They are streamed from any iterable into COPY without being held in
+        memory. Scalar and callable column defaults are applied, but SQL
+        expression defaults like func.now() are not. Other databases and
+        drivers fall back to executemany in batches of batch_size, like
+        bulk_create. Returns the number of rows loaded.
+        """
+        connection = session.connection()
+        if connection.dialect.driver == "psycopg2":
+            count = copy_rows(connection, cls.__table__, rows)
+        else:
+            count = 0
+            statement = insert(cls.__table__)
+            for chunk in chunked(rows, batch_size):
+                session.execute(statement, chunk)
+                count += len(chunk)
+        if commit:
+            session.commit()
+        return count
+
+    @classmethod
+    def bulk_upsert(
+        cls,
+        session,
+        rows,
+        conflict_cols,
+        update_cols=None,
+        commit=True,
+        returning=False,
+        batch_size=1000,
+    ):
+        """Insert many records, updating the ones that conflict on conflict_cols.
+
+        Uses INSERT ... ON CONFLICT on Postgres and SQLite. conflict_cols must
+        match a unique index or constraint. On conflict the update_cols are
+        updated, which defaults to every column in the rows that is not in
+        conflict_cols. Conflicting rows are skipped if there are no columns to
+        update. Rows are dictionaries of column values that all have the same
+        keys. Rows of one batch with the same conflict_cols values are
+        updated with the last of them, skipped rows keep the first. If
+        returning is True, the primary keys of the inserted, updated or
+        skipped records are returned in the order of the rows. Instances
+        already loaded in the session are not refreshed.
+        """
+        dialect = session.get_bind().dialect
+        if dialect.name not in UPSERT_DIALECTS:
+            raise NotImplementedError(f"Upsert is not supported on {dialect.name}")
+
+        primary_keys = []
+        for chunk in chunked(rows, batch_size):
+            statement = UPSERT_DIALECTS[dialect.name](cls.__table__)
+            if update_cols is None:
+                chunk_update_cols = [
+                    key for key in chunk[0] if key not in conflict_cols
+                ]
+            else:
+                chunk_update_cols = update_cols
+            keys = [tuple(row[name] for name in conflict_cols) for row in chunk]
+            if chunk_update_cols:
+                # Postgres refuses to update a row twice in one statement
+                unique_rows = dict(zip(keys, chunk))
+                statement = statement.on_conflict_do_update(
+                    index_elements=conflict_cols,
+                    set_={key: statement.excluded[key] for key in chunk_update_cols},
+                )
+            else:
+                unique_rows = None
+                statement = statement.on_conflict_do_nothing(
+                    index_elements=conflict_cols
+                )
+
+            if unique_rows is None:
+                session.execute(statement, chunk)
+                if returning:
+                    # skipped rows are not returned by RETURNING
+                    primary_keys.extend(cls._lookup_pks(session, chunk, conflict_cols))
+            elif returning and dialect.insert_executemany_returning:
+                result = session.execute(
+                    statement.returning(*cls._pk_columns()), list(unique_rows.values())
+                )
+                found = dict(zip(unique_rows, (cls._pk_value(row) for row in result)))
+                primary_keys.extend(found[key] for key in keys)
+            else:
+                session.execute(statement, list(unique_rows.values()))
+                if returning:
+                    primary_keys.extend(cls._lookup_pks(session, chunk, conflict_cols))
+        if commit:
+            session.commit()
+        return primary_keys if returning else None
+
+    @classmethod
+    def _pk_columns(cls):
+        """Return the primary key columns of the table."""
+        return list(cls.__table__.primary_key.columns)
+
+    @staticmethod
+    def _pk_value(row):
+        """Return a single primary key value, or a tuple for composite keys."""
+        return row[0] if len(row) == 1 else tuple(row)
+
+    @classmethod
+    def _lookup_pks(cls, session, rows, conflict_cols):
+        """Return the primary keys of the rows, found by their conflict_cols values."""
+        table = cls.__table__
+        columns = [table.c[name] for name in conflict_cols]
+        keys = [tuple(row[name] for name in conflict_cols) for row in rows]
+        result = session.execute(
+            select(*columns, *cls._pk_columns()).where(tuple_(*columns).in_(keys))
+        )
+        width = len(columns)
+        found = {tuple(row[:width]): cls._pk_value(row[width:]) for row in result}
+        return [found.get(key) for key in keys]
+
+    @classmethod
+    async def acreate(cls, session, **kwargs):
+        """Create a new record and save it the database using an AsyncSession."""
+        instance = cls(**kwargs)
+        return await instance.asave(session)
+
+    async def aupdate(self, session, commit=True, **kwargs):
+        """Update specific fields of a record using an AsyncSession."""
+        invalidate_instance(self)
+        for attr, value in kwargs.items():
+            setattr(self, attr, value)
+        return await self.asave(session) if commit else self
+
+    async def asave(self, session, commit=True):
+        """Save the record using an AsyncSession."""
+        invalidate_instance(self)
+        session.add(self)
+        if commit:
+            await session.commit()
+        return self
+
+    async def adelete(self, session, commit=True):
+        """Remove the record from the database using an AsyncSession."""
+        invalidate_instance(self)
+        await session.delete(self)
+        return commit and await session.commit()
+
 
 class Model(CRUDMixin, Base):  # type: ignore[valid-type, misc]
     """Base model class that includes CRUD convenience methods."""
@@ -51,29 +246,97 @@ class SurrogatePK(Model):  # pylint: disable=too-few-public-methods
 
     id = Column(Integer, primary_key=True)
 
-    @classmethod
-    def get_by_id(cls, record_id, session=None):
-        """Get record by ID."""
-        if any(
+    @staticmethod
+    def _is_valid_id(record_id):
+        """Return True if the record_id can be used as an integer primary key."""
+        return any(
             (
                 isinstance(record_id, (str, bytes)) and record_id.isdigit(),
                 isinstance(record_id, (int, float)),
             ),
-        ):
-            if session:
-                return session.query(cls).get(int(record_id))
-            return cls.query.get(int(record_id))
+        )
+
+    @classmethod
+    def get_by_id(cls, record_id, session=None):
+        """Get record by ID.
+
+        When the identity cache is enabled (see fm_database.cache) records
+        are served from it and only loaded from the database on a miss.
+        """
+        if cls._is_valid_id(record_id):
+            if not session:
+                session = cls.query.session
+            return get_cached(session, cls, int(record_id))
         return None
 
+    @classmethod
+    def get_by_ids(cls, record_ids, session=None):
+        """Get records by a list of IDs.
+
+        Returns a list in the order of record_ids with None for invalid IDs
+        and missing records. Instances already loaded in the session are
+        used as they are and the rest are loaded with IN queries sized for
+        the parameter limit of the dialect. The identity cache behind
+        get_by_id is not used, one query for many records is cheaper than
+        filling it a record at a time.
+        """
+        if not session:
+            session = cls.query.session
+        ids = [int(rid) if cls._is_valid_id(rid) else None for rid in record_ids]
+
+        found = {}
+        missing = []
+        for record_id in dict.fromkeys(ids):
+            if record_id is None:
+                continue
+            instance = session.identity_map.get(session.identity_key(cls, record_id))
+            if instance is not None and not inspect(instance).expired:
+                found[record_id] = instance
+            else:
+                missing.append(record_id)
+
+        dialect_name = session.get_bind().dialect.name
+        size = MAX_BIND_PARAMS.get(dialect_name, DEFAULT_MAX_BIND_PARAMS)
+        for chunk in chunked(missing, size):
+            for instance in session.query(cls).filter(cls.id.in_(chunk)):
+                found[instance.id] = instance
+        return [found.get(record_id) for record_id in ids]
+
+    @classmethod
+    async def aget_by_id(cls, record_id, session):
+        """Get record by ID using an AsyncSession."""
+        if cls._is_valid_id(record_id):
+            return await session.get(cls, int(record_id))
+        return None
 
-def reference_col(tablename, nullable=False, pk_name="id", **kwargs):
+
+def expire_loaded(session, model, record_ids, attribute_names):
+    """Expire attributes of instances of model that the session has loaded.
+
+    Used after bulk UPDATE statements that do not synchronize the session.
+    If record_ids is None every loaded instance of the model is expired.
+    """
+    for instance in list(session.identity_map.values()):
+        if isinstance(instance, model) and (
+            record_ids is None or instance.id in record_ids
+        ):
+            session.expire(instance, attribute_names)
+
+
+def reference_col(tablename, nullable=False, pk_name="id", index=True, **kwargs):
     """Column that adds primary key foreign key reference.
 
+    The column is indexed unless index=False is passed, which is only worth
+    doing when another index already starts with the column.
+
     Usage: ::
 
         category_id = reference_col('category')
         category = relationship('Category', backref='categories')
     """
     return Column(
-        ForeignKey("{0}.{1}".format(tablename, pk_name)), nullable=nullable, **kwargs
+        ForeignKey("{0}.{1}".format(tablename, pk_name)),
+        nullable=nullable,
+        index=index,
+        **kwargs,
     )
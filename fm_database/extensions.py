@@ -2,4 +2,27 @@
 """Extensions."""
 from passlib.context import CryptContext  # type: ignore [import]
 
+from .settings import get_config
+
 pwd_context = CryptContext(schemes=["pbkdf2_sha256"], deprecated="auto")
+
+_pwd_contexts = {}
+
+
+def get_pwd_context(config=None):
+    """Return the password context with the hash rounds of the config.
+
+    Hashes with fewer rounds than PASSWORD_HASH_ROUNDS need an update, so
+    raising it rehashes passwords as users log in. None uses the passlib
+    default rounds.
+    """
+    if config is None:
+        config = get_config()
+    rounds = config.PASSWORD_HASH_ROUNDS
+    if rounds is None:
+        return pwd_context
+    if rounds not in _pwd_contexts:
+        _pwd_contexts[rounds] = pwd_context.copy(
+            pbkdf2_sha256__default_rounds=rounds, pbkdf2_sha256__min_rounds=rounds
+        )
+    return _pwd_contexts[rounds]
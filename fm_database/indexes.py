@@ -0,0 +1,88 @@
+# -*- coding: utf-8 -*-
+"""Find columns that are queried without a supporting index."""
+from sqlalchemy import PrimaryKeyConstraint, UniqueConstraint, text
+
+# columns the models filter or join on in their queries, as "table.column"
+HOT_FILTER_COLUMNS = (
+    "device.device_id",
+    "grainbin.device_id",
+    "message.destination",
+    "message.lease_token",
+    "message.valid_to",
+    "roles.name",
+    "sensor_reading.sensor_id",
+    "sensor_reading.timestamp",
+    "system_wifi.interface_id",
+    "temperature_cable.grainbin_id",
+    "temperature_sensor.cable_id",
+    "users.email",
+    "users.username",
+)
+
+
+def _leading_columns(table):
+    """Return the column name tuples of the indexes and keys of a table."""
+    keys = [tuple(column.name for column in index.columns) for index in table.indexes]
+    for constraint in table.constraints:
+        if isinstance(constraint, (PrimaryKeyConstraint, UniqueConstraint)):
+            keys.append(tuple(column.name for column in constraint.columns))
+    for column in table.columns:
+        if column.unique:
+            keys.append((column.name,))
+    return keys
+
+
+def is_indexed(table, column_names):
+    """Return True if an index or key of the table starts with the columns."""
+    column_names = set(column_names)
+    width = len(column_names)
+    return any(set(key[:width]) == column_names for key in _leading_columns(table))
+
+
+def missing_fk_indexes(metadata):
+    """Return (table, columns, referred table) for foreign keys without an index."""
+    missing = []
+    for table in metadata.sorted_tables:
+        for constraint in table.foreign_key_constraints:
+            column_names = [column.name for column in constraint.columns]
+            if not is_indexed(table, column_names):
+                missing.append(
+                    (table.name, tuple(column_names), constraint.referred_table.name)
+                )
+    return missing
+
+
+def missing_filter_indexes(metadata, columns=HOT_FILTER_COLUMNS):
+    """Return the "table.column" names of filter columns without an index.
+
+    Raises ValueError for names that are not a column of a table in the
+    metadata.
+    """
+    missing = []
+    for name in columns:
+        table_name, _, column_name = name.partition(".")
+        table = metadata.tables.get(table_name)
+        if table is None or column_name not in table.columns:
+            raise ValueError(f"Unknown column '{name}', expected 'table.column'")
+        if not is_indexed(table, [column_name]):
+            missing.append(name)
+    return missing
+
+
+def sequential_scans(connection, limit=10):
+    """Return the tables Postgres reads most rows from with sequential scans.
+
+    Each row has the table name, seq_scan, seq_tup_read and idx_scan from
+    pg_stat_user_tables. Returns an empty list on other databases.
+    """
+    if connection.dialect.name != "postgresql":
+        return []
+    result = connection.execute(
+        text(
+            "SELECT relname, seq_scan, seq_tup_read, coalesce(idx_scan, 0) "
+            "FROM pg_stat_user_tables WHERE seq_scan > 0 "
+            "ORDER BY seq_tup_read DESC LIMIT :limit"
+        ),
+        {"limit": limit},
+    )
+    return result.all()
@@ -1,10 +1,97 @@
 # -*- coding: utf-8 -*-
 """Device models."""
-from sqlalchemy import Boolean, Column, DateTime, Integer, Interval, String
-from sqlalchemy.orm import relationship
+import datetime as dt
+
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    Float,
+    Index,
+    Integer,
+    Interval,
+    String,
+    select,
+    update,
+)
+from sqlalchemy.orm import relationship, selectinload
 from sqlalchemy.sql import func
 
-from ..database import SurrogatePK, reference_col
+from ..database import (
+    DEFAULT_MAX_BIND_PARAMS,
+    MAX_BIND_PARAMS,
+    Model,
+    SurrogatePK,
+    chunked,
+    expire_loaded,
+    reference_col,
+)
+
+
+class SensorReading(Model):
+    """A temperature reading from a sensor at a point in time.
+
+    Readings are append only. The primary key on (sensor_id, timestamp)
+    rejects duplicate readings and serves time range queries for a sensor.
+    received_at records when the reading was stored, which is the order
+    readings are rolled up in.
+    """
+
+    __tablename__ = "sensor_reading"
+    __table_args__ = (Index("ix_sensor_reading_timestamp", "timestamp"),)
+
+    # the primary key index starts with sensor_id
+    sensor_id = reference_col("temperature_sensor", primary_key=True, index=False)
+    timestamp = Column(DateTime, primary_key=True)
+    value = Column(Float, nullable=False)
+    received_at = Column(DateTime, nullable=False, default=dt.datetime.now, index=True)
+
+    def __init__(self, sensor_id, timestamp, value):
+        """Create the instance."""
+        self.sensor_id = sensor_id
+        self.timestamp = timestamp
+        self.value = value
+
+    def __repr__(self):
+        """Represent the instance as a string."""
+        return f"<SensorReading: {self.sensor_id} {self.timestamp}>"
+
+    @classmethod
+    def ingest(cls, session, readings, commit=True, batch_size=1000):
+        """Append (sensor_id, timestamp, value) readings in batches.
+
+        Readings that are already stored are skipped. The last_value of the
+        sensors that received readings is refreshed afterwards.
+        """
+        sensor_ids = set()
+
+        def rows():
+            for sensor_id, timestamp, value in readings:
+                sensor_ids.add(sensor_id)
+                yield {"sensor_id": sensor_id, "timestamp": timestamp, "value": value}
+
+        cls.bulk_upsert(
+            session,
+            rows(),
+            ["sensor_id", "timestamp"],
+            update_cols=[],
+            commit=False,
+            batch_size=batch_size,
+        )
+        if sensor_ids:
+            TemperatureSensor.refresh_last_values(session, sensor_ids)
+        if commit:
+            session.commit()
+
+    @classmethod
+    def get_range(cls, session, sensor_id, start, end=None):
+        """Return the readings of a sensor from start up to end, oldest first."""
+        query = session.query(cls).filter(
+            cls.sensor_id == sensor_id, cls.timestamp >= start
+        )
+        if end is not None:
+            query = query.filter(cls.timestamp < end)
+        return query.order_by(cls.timestamp).all()
 
 
 class TemperatureSensor(SurrogatePK):
@@ -12,20 +99,45 @@ class TemperatureSensor(SurrogatePK):
 
     __tablename__ = "temperature_sensor"
 
-    templow = Column(String(4))
-    temphigh = Column(String(4))
-    last_value = Column(String(7))
+    templow = Column(Float)
+    temphigh = Column(Float)
+    last_value = Column(Float)
     cable_id = reference_col("temperature_cable")
 
     def __init__(self, cable_id):
         """Create the instance."""
         self.cable_id = cable_id
-        self.last_value = "unknown"
 
     def __repr__(self):
         """Represent the instance as a string."""
         return f"<TemperatureSensor: {self.id}>"
 
+    @classmethod
+    def refresh_last_values(cls, session, sensor_ids):
+        """Set last_value of the sensors to the value of their newest reading.
+
+        This runs as one UPDATE statement for each batch of ids that fits the
+        parameter limit of the dialect. Sensors without readings keep their
+        current last_value.
+        """
+        newest = (
+            select(SensorReading.value)
+            .where(SensorReading.sensor_id == cls.id)
+            .order_by(SensorReading.timestamp.desc())
+            .limit(1)
+            .scalar_subquery()
+        )
+        dialect_name = session.get_bind().dialect.name
+        size = MAX_BIND_PARAMS.get(dialect_name, DEFAULT_MAX_BIND_PARAMS)
+        for chunk in chunked(sensor_ids, size):
+            session.execute(
+                update(cls)
+                .where(cls.id.in_(chunk), newest.isnot(None))
+                .values(last_value=newest)
+                .execution_options(synchronize_session=False)
+            )
+        expire_loaded(session, cls, set(sensor_ids), ["last_value"])
+
 
 class TemperatureCable(SurrogatePK):
     """Model a temperature cable."""
@@ -61,7 +173,7 @@ class Grainbin(SurrogatePK):
     location = Column(String(20))
     description = Column(String(50))
     total_updates = Column(Integer)
-    average_temp = Column(String(7))
+    average_temp = Column(Float)
     bus_number = Column(Integer, nullable=False)
     user_configured = Column(Boolean, default=False)
 
@@ -88,6 +200,52 @@ class Grainbin(SurrogatePK):
         """Represent the grainbin as a string."""
         return f"<Grainbin: {self.id}>"
 
+    @classmethod
+    def temperature_stats(cls, session, grainbin_ids=None):
+        """Return the sensor temperature aggregates of each grainbin.
+
+        The last_value of the sensors is aggregated in SQL. Each row has
+        grainbin_id, min_temp, max_temp, avg_temp and sensor_count.
+        """
+        query = (
+            session.query(
+                TemperatureCable.grainbin_id,
+                func.min(TemperatureSensor.last_value).label("min_temp"),
+                func.max(TemperatureSensor.last_value).label("max_temp"),
+                func.avg(TemperatureSensor.last_value).label("avg_temp"),
+                func.count(TemperatureSensor.last_value).label("sensor_count"),
+            )
+            .join(TemperatureSensor, TemperatureSensor.cable_id == TemperatureCable.id)
+            .group_by(TemperatureCable.grainbin_id)
+        )
+        if grainbin_ids is not None:
+            query = query.filter(TemperatureCable.grainbin_id.in_(list(grainbin_ids)))
+        return query.all()
+
+    @classmethod
+    def refresh_average_temps(cls, session, grainbin_ids=None):
+        """Set average_temp of the grainbins from their sensors in one UPDATE statement."""
+        average = (
+            select(func.avg(TemperatureSensor.last_value))
+            .join(TemperatureCable, TemperatureSensor.cable_id == TemperatureCable.id)
+            .where(TemperatureCable.grainbin_id == cls.id)
+            .scalar_subquery()
+        )
+        statement = (
+            update(cls)
+            .values(average_temp=average)
+            .execution_options(synchronize_session=False)
+        )
+        if grainbin_ids is not None:
+            statement = statement.where(cls.id.in_(list(grainbin_ids)))
+        session.execute(statement)
+        expire_loaded(
+            session,
+            cls,
+            None if grainbin_ids is None else set(grainbin_ids),
+            ["average_temp", "last_updated"],
+        )
+
 
 class Device(SurrogatePK):
     """A device."""
@@ -106,9 +264,9 @@ class Device(SurrogatePK):
     user_configured = Column(Boolean, default=False)
 
     last_update_received = Column(DateTime, nullable=True, default=None)
-    interior_temp = Column(String(7), nullable=True, default=None)
-    exterior_temp = Column(String(7), nullable=True, default=None)
-    device_temp = Column(String(7), nullable=True, default=None)
+    interior_temp = Column(Float, nullable=True, default=None)
+    exterior_temp = Column(Float, nullable=True, default=None)
+    device_temp = Column(Float, nullable=True, default=None)
     uptime = Column(Interval, nullable=True, default=None)
     current_time = Column(DateTime, nullable=True, default=None)
     load_avg = Column(String(20), nullable=True, default=None)
@@ -140,3 +298,47 @@ class Device(SurrogatePK):
     def __repr__(self):
         """Represent the device as a string."""
         return f"<Device: {self.name}>"
+
+    @classmethod
+    def temperature_stats(cls, session, device_ids=None):
+        """Return the sensor temperature aggregates of each device.
+
+        The last_value of the sensors in all bins of a device is aggregated in
+        SQL. Each row has device_id, min_temp, max_temp, avg_temp and sensor_count.
+        """
+        query = (
+            session.query(
+                Grainbin.device_id,
+                func.min(TemperatureSensor.last_value).label("min_temp"),
+                func.max(TemperatureSensor.last_value).label("max_temp"),
+                func.avg(TemperatureSensor.last_value).label("avg_temp"),
+                func.count(TemperatureSensor.last_value).label("sensor_count"),
+            )
+            .join(TemperatureCable, TemperatureCable.grainbin_id == Grainbin.id)
+            .join(TemperatureSensor, TemperatureSensor.cable_id == TemperatureCable.id)
+            .group_by(Grainbin.device_id)
+        )
+        if device_ids is not None:
+            query = query.filter(Grainbin.device_id.in_(list(device_ids)))
+        return query.all()
+
+
+def load_device_tree(session, device_ids):
+    """Return the devices with their bins, cables and sensors loaded.
+
+    The whole tree is loaded with select IN loading in four queries however
+    many devices, bins and cables there are, so walking Device.bins,
+    Grainbin.cables and TemperatureCable.sensors emits no more queries.
+    Devices are returned ordered by id and missing ids are skipped.
+    """
+    return (
+        session.query(Device)
+        .filter(Device.id.in_(list(device_ids)))
+        .options(
+            selectinload(Device.bins)
+            .selectinload(Grainbin.cables)
+            .selectinload(TemperatureCable.sensors)
+        )
+        .order_by(Device.id)
+        .all()
+    )
@@ -1,17 +1,45 @@
 # -*- coding: utf-8 -*-
 """Message model for farm monitor."""
 import datetime as dt
+import uuid
 
-from sqlalchemy import Column, DateTime, PickleType, String
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Index,
+    Integer,
+    String,
+    delete,
+    or_,
+    select,
+    text,
+    update,
+)
 from sqlalchemy.sql import func
 
+from ..codecs import PayloadType
 from ..database import SurrogatePK
 
 
 class Message(SurrogatePK):
-    """A message sent between devices."""
+    """A message sent between devices.
+
+    Messages can be consumed as a queue by several workers with
+    dequeue, ack and nack. Expired messages are removed with purge_expired.
+    """
 
     __tablename__ = "message"
+    __table_args__ = (
+        Index(
+            "ix_message_pending",
+            "destination",
+            "classification",
+            "valid_from",
+            postgresql_where=text("acked_at IS NULL"),
+            sqlite_where=text("acked_at IS NULL"),
+        ),
+        SurrogatePK.__table_args__,
+    )
 
     source = Column(String(20))
     destination = Column(String(20))
@@ -19,9 +47,15 @@ class Message(SurrogatePK):
 
     created_at = Column(DateTime, default=func.now())
     valid_from = Column(DateTime)
-    valid_to = Column(DateTime)
+    valid_to = Column(DateTime, index=True)
+
+    payload = Column(PayloadType(jsonb=True), default=None)
 
-    payload = Column(PickleType, default=None)
+    # queue state
+    leased_until = Column(DateTime, nullable=True, default=None)
+    lease_token = Column(String(32), nullable=True, default=None, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    acked_at = Column(DateTime, nullable=True, default=None)
 
     def __init__(self, source, destination, classification):
         """Create an instance."""
@@ -42,3 +76,156 @@ class Message(SurrogatePK):
 
         self.valid_from = dt.datetime.now() + valid_from
         self.valid_to = dt.datetime.now() + valid_to
+
+    @classmethod
+    def enqueue(
+        cls,
+        session,
+        source,
+        destination,
+        classification,
+        payload=None,
+        valid_from: dt.timedelta = None,
+        valid_to: dt.timedelta = None,
+        commit=True,
+    ):
+        """Create a message that can be dequeued once it is valid."""
+        message = cls(source, destination, classification)
+        message.payload = payload
+        message.set_datetime(valid_from=valid_from, valid_to=valid_to)
+        return message.save(session, commit=commit)
+
+    @classmethod
+    def dequeue(
+        cls,
+        session,
+        destination,
+        classification=None,
+        batch_size=1,
+        lease: dt.timedelta = dt.timedelta(seconds=30),
+    ):
+        """Lease up to batch_size valid messages for the destination.
+
+        Leased messages are hidden from other consumers until the lease runs
+        out. They must be acked once processed or nacked to release them.
+        On Postgres the candidate rows are locked with FOR UPDATE SKIP LOCKED
+        so concurrent consumers never wait on or claim the same messages. On
+        SQLite the claiming UPDATE is serialized by the database lock.
+        The session is committed so that the leases are visible to others.
+        """
+        now = dt.datetime.now()
+        candidates = (
+            select(cls.id)
+            .where(
+                cls.destination == destination,
+                cls.acked_at.is_(None),
+                or_(cls.valid_from.is_(None), cls.valid_from <= now),
+                or_(cls.valid_to.is_(None), cls.valid_to > now),
+                or_(cls.leased_until.is_(None), cls.leased_until <= now),
+            )
+            .order_by(cls.valid_from, cls.id)
+            .limit(batch_size)
+        )
+        if classification is not None:
+            candidates = candidates.where(cls.classification == classification)
+        if session.get_bind().dialect.name == "postgresql":
+            candidates = candidates.with_for_update(skip_locked=True)
+
+        token = uuid.uuid4().hex
+        session.execute(
+            update(cls)
+            .where(cls.id.in_(candidates.scalar_subquery()))
+            .values(
+                leased_until=now + lease,
+                lease_token=token,
+                attempts=cls.attempts + 1,
+            )
+            .execution_options(synchronize_session=False)
+        )
+        session.commit()
+        return (
+            session.query(cls)
+            .populate_existing()
+            .filter(cls.lease_token == token)
+            .order_by(cls.valid_from, cls.id)
+            .all()
+        )
+
+    @classmethod
+    def ack(cls, session, messages, commit=True):
+        """Mark leased messages as processed so they are never dequeued again.
+
+        Messages whose lease ran out and were leased again by another
+        consumer are left alone. Returns the number of messages acked.
+        """
+        return cls._end_leases(session, messages, commit, acked_at=dt.datetime.now())
+
+    @classmethod
+    def nack(cls, session, messages, delay: dt.timedelta = None, commit=True):
+        """Release leased messages so they can be dequeued again after delay.
+
+        Returns the number of messages released.
+        """
+        leased_until = dt.datetime.now() + delay if delay is not None else None
+        return cls._end_leases(session, messages, commit, leased_until=leased_until)
+
+    @classmethod
+    def _end_leases(cls, session, messages, commit, **values):
+        """Update the messages that still hold the lease they were dequeued with."""
+        if not messages:
+            return 0
+        result = session.execute(
+            update(cls)
+            .where(
+                cls.id.in_([message.id for message in messages]),
+                cls.lease_token.in_({message.lease_token for message in messages}),
+            )
+            .values(lease_token=None, **values)
+            .execution_options(synchronize_session=False)
+        )
+        for message in messages:
+            if message in session:
+                session.expire(message)
+        if commit:
+            session.commit()
+        return result.rowcount
+
+    @classmethod
+    def purge_expired(
+        cls, session, before=None, batch_size=1000, max_batches=None, dry_run=False
+    ):
+        """Delete messages whose valid_to is older than before, in batches.
+
+        Each batch deletes at most batch_size rows and is committed on its
+        own, so locks are held briefly and Postgres can recycle the WAL
+        between batches. Purging stops after max_batches when it is given.
+        With dry_run nothing is deleted. Returns the number of messages
+        deleted, or the number that would be deleted with dry_run.
+        """
+        if before is None:
+            before = dt.datetime.now()
+        expired = cls.valid_to < before
+
+        if dry_run:
+            count = session.query(func.count(cls.id)).filter(expired).scalar()
+            if max_batches is not None:
+                count = min(count, max_batches * batch_size)
+            return count
+
+        total = 0
+        batches = 0
+        while max_batches is None or batches < max_batches:
+            batch = (
+                select(cls.id).where(expired).order_by(cls.valid_to).limit(batch_size)
+            )
+            result = session.execute(
+                delete(cls)
+                .where(cls.id.in_(batch.scalar_subquery()))
+                .execution_options(synchronize_session=False)
+            )
+            session.commit()
+            total += result.rowcount
+            batches += 1
+            if result.rowcount < batch_size:
+                break
+        return total
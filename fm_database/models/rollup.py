@@ -0,0 +1,254 @@
+# -*- coding: utf-8 -*-
+"""Rollups of the sensor reading history."""
+import datetime as dt
+
+from sqlalchemy import (
+    Column,
+    DateTime,
+    Float,
+    Integer,
+    String,
+    func,
+    literal,
+    literal_column,
+    select,
+)
+
+from ..database import UPSERT_DIALECTS, Model
+from ..settings import get_config
+from .device import SensorReading, TemperatureCable, TemperatureSensor
+
+# resolution name -> bucket width, coarsest first
+RESOLUTIONS = {
+    "day": dt.timedelta(days=1),
+    "hour": dt.timedelta(hours=1),
+    "minute": dt.timedelta(minutes=1),
+}
+
+# strftime formats that truncate a timestamp on sqlite. The output matches
+# the format sqlalchemy stores DateTime values in so the buckets compare
+# correctly against bound datetimes.
+SQLITE_BUCKET_FORMATS = {
+    "day": "%Y-%m-%d 00:00:00.000000",
+    "hour": "%Y-%m-%d %H:00:00.000000",
+    "minute": "%Y-%m-%d %H:%M:00.000000",
+}
+
+SCOPES = ("sensor", "cable", "grainbin")
+
+# the watermark of a rollup that has not rolled up any readings yet
+NO_WATERMARK = dt.datetime(1970, 1, 1)
+
+
+class ReadingRollup(Model):
+    """Aggregated readings of a sensor, cable or grainbin over a time bucket."""
+
+    __tablename__ = "reading_rollup"
+
+    scope = Column(String(10), primary_key=True)
+    scope_id = Column(Integer, primary_key=True)
+    resolution = Column(String(10), primary_key=True)
+    bucket = Column(DateTime, primary_key=True)
+
+    min_value = Column(Float, nullable=False)
+    max_value = Column(Float, nullable=False)
+    sum_value = Column(Float, nullable=False)
+    count = Column(Integer, nullable=False)
+
+    def __repr__(self):
+        """Represent the instance as a string."""
+        return f"<ReadingRollup: {self.scope} {self.scope_id} {self.resolution} {self.bucket}>"
+
+    @property
+    def average(self):
+        """Return the average value of the bucket."""
+        return self.sum_value / self.count
+
+    @classmethod
+    def get_range(
+        cls, session, scope, scope_id, start, end, resolution=None, min_points=60
+    ):
+        """Return the rollups of a sensor, cable or grainbin from start up to end.
+
+        Unless a resolution is given, the coarsest one that still gives
+        min_points buckets over the range is used.
+        """
+        if resolution is None:
+            resolution = choose_resolution(start, end, min_points)
+        return (
+            session.query(cls)
+            .filter(
+                cls.scope == scope,
+                cls.scope_id == scope_id,
+                cls.resolution == resolution,
+                cls.bucket >= truncate(start, resolution),
+                cls.bucket < end,
+            )
+            .order_by(cls.bucket)
+            .all()
+        )
+
+
+class RollupWatermark(Model):
+    """The received_at of the newest reading that has been rolled up."""
+
+    __tablename__ = "rollup_watermark"
+
+    name = Column(String(20), primary_key=True)
+    watermark = Column(DateTime, nullable=False)
+
+    def __init__(self, name, watermark):
+        """Create the instance."""
+        self.name = name
+        self.watermark = watermark
+
+
+def choose_resolution(start, end, min_points=60):
+    """Return the coarsest resolution with at least min_points buckets from start to end."""
+    for resolution, width in RESOLUTIONS.items():
+        if (end - start) / width >= min_points:
+            return resolution
+    return "minute"
+
+
+def truncate(timestamp, resolution):
+    """Return the start of the bucket that the timestamp falls in."""
+    if resolution == "day":
+        return timestamp.replace(hour=0, minute=0, second=0, microsecond=0)
+    if resolution == "hour":
+        return timestamp.replace(minute=0, second=0, microsecond=0)
+    return timestamp.replace(second=0, microsecond=0)
+
+
+def _bucket_expression(dialect_name, resolution):
+    """Return the SQL expression that truncates a reading timestamp."""
+    if dialect_name == "postgresql":
+        # rendered inline so the select and group by expressions are identical
+        return func.date_trunc(
+            literal_column(f"'{resolution}'"), SensorReading.timestamp
+        )
+    return func.strftime(SQLITE_BUCKET_FORMATS[resolution], SensorReading.timestamp)
+
+
+def _scope_select(scope, resolution, bucket, lower, upper):
+    """Return the aggregate of the readings received in (lower, upper] for a scope."""
+    scope_ids = {
+        "sensor": SensorReading.sensor_id,
+        "cable": TemperatureSensor.cable_id,
+        "grainbin": TemperatureCable.grainbin_id,
+    }
+    statement = select(
+        literal(scope),
+        scope_ids[scope],
+        literal(resolution),
+        bucket,
+        func.min(SensorReading.value),
+        func.max(SensorReading.value),
+        func.sum(SensorReading.value),
+        func.count(SensorReading.value),
+    )
+    if scope in ("cable", "grainbin"):
+        statement = statement.join(
+            TemperatureSensor, TemperatureSensor.id == SensorReading.sensor_id
+        )
+    if scope == "grainbin":
+        statement = statement.join(
+            TemperatureCable, TemperatureCable.id == TemperatureSensor.cable_id
+        )
+    return statement.where(
+        SensorReading.received_at > lower, SensorReading.received_at <= upper
+    ).group_by(scope_ids[scope], bucket)
+
+
+def refresh_rollups(session, name="sensor_reading", commit=True, grace=None):
+    """Roll up the readings that were received since the watermark.
+
+    The new readings are aggregated per sensor, cable and grainbin in minute,
+    hour and day buckets of their timestamp and merged into the existing
+    rollups. The watermark follows received_at, so readings that arrive late
+    for a bucket that was already rolled up are still merged into it.
+
+    received_at is set when a reading is inserted, not when it is committed.
+    Readings received in the last grace period, a timedelta that defaults
+    to the ROLLUP_GRACE_SECONDS config option, are left for the next run so
+    that the rows of ingest transactions that are still open are not
+    skipped. Readings of an ingest transaction that commits more than the
+    grace period after inserting them are never rolled up, so the grace
+    must be longer than the longest ingest transaction.
+
+    The watermark row is locked with SELECT ... FOR UPDATE, so runs that
+    overlap on Postgres wait for each other instead of rolling up the same
+    readings twice. Returns the new watermark, or None if there was nothing
+    to roll up.
+    """
+    dialect_name = session.get_bind().dialect.name
+    if dialect_name not in UPSERT_DIALECTS:
+        raise NotImplementedError(f"Rollups are not supported on {dialect_name}")
+    if grace is None:
+        grace = dt.timedelta(seconds=get_config().ROLLUP_GRACE_SECONDS)
+
+    session.execute(
+        UPSERT_DIALECTS[dialect_name](RollupWatermark.__table__)
+        .values(name=name, watermark=NO_WATERMARK)
+        .on_conflict_do_nothing(index_elements=["name"])
+    )
+    watermark = (
+        session.query(RollupWatermark)
+        .filter(RollupWatermark.name == name)
+        .with_for_update()
+        .populate_existing()
+        .one()
+    )
+    lower = watermark.watermark
+    upper = (
+        session.query(func.max(SensorReading.received_at))
+        .filter(
+            SensorReading.received_at > lower,
+            SensorReading.received_at <= dt.datetime.now() - grace,
+        )
+        .scalar()
+    )
+    if upper is None:
+        if commit:
+            session.commit()
+        return None
+
+    table = ReadingRollup.__table__
+    columns = [
+        "scope",
+        "scope_id",
+        "resolution",
+        "bucket",
+        "min_value",
+        "max_value",
+        "sum_value",
+        "count",
+    ]
+    least, greatest = (
+        (func.least, func.greatest)
+        if dialect_name == "postgresql"
+        else (func.min, func.max)
+    )
+    for resolution in RESOLUTIONS:
+        bucket = _bucket_expression(dialect_name, resolution)
+        for scope in SCOPES:
+            statement = UPSERT_DIALECTS[dialect_name](table).from_select(
+                columns, _scope_select(scope, resolution, bucket, lower, upper)
+            )
+            statement = statement.on_conflict_do_update(
+                index_elements=["scope", "scope_id", "resolution", "bucket"],
+                set_={
+                    "min_value": least(table.c.min_value, statement.excluded.min_value),
+                    "max_value": greatest(
+                        table.c.max_value, statement.excluded.max_value
+                    ),
+                    "sum_value": table.c.sum_value + statement.excluded.sum_value,
+                    "count": table.c.count + statement.excluded.count,
+                },
+            )
+            session.execute(statement)
+
+    watermark.watermark = upper
+    if commit:
+        session.commit()
+    return upper
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Read only snapshots of the device topology."""
+from collections import defaultdict, namedtuple
+
+from sqlalchemy import select
+
+from .device import Device, Grainbin, TemperatureCable, TemperatureSensor
+
+
+def _snapshot_type(model, children=None):
+    """Return a named tuple type with the columns of the model's table.
+
+    If children is given it is added as the last field and holds a tuple of
+    the child snapshots.
+    """
+    fields = [column.key for column in model.__table__.columns]
+    if children is not None:
+        fields.append(children)
+    snapshot_type = namedtuple(f"{model.__name__}Snapshot", fields)
+    snapshot_type.__doc__ = f"Immutable snapshot of a {model.__name__} row."
+    return snapshot_type
+
+
+TemperatureSensorSnapshot = _snapshot_type(TemperatureSensor)
+TemperatureCableSnapshot = _snapshot_type(TemperatureCable, "sensors")
+GrainbinSnapshot = _snapshot_type(Grainbin, "cables")
+DeviceSnapshot = _snapshot_type(Device, "bins")
+
+
+def _select_rows(session, table, where):
+    """Return the rows of a table that match where, ordered by id."""
+    statement = select(table).where(where).order_by(table.c.id)
+    return session.execute(statement).all()
+
+
+def load_device_snapshots(session, device_ids):
+    """Return snapshots of the devices with their bins, cables and sensors.
+
+    Each level is loaded with one Core SELECT and built into named tuples
+    without creating ORM instances, so this is much cheaper than
+    load_device_tree for read only use. Devices are returned ordered by id
+    and missing ids are skipped. Children are tuples ordered by id.
+    """
+    device_ids = list(device_ids)
+    devices = Device.__table__
+    bins = Grainbin.__table__
+    cables = TemperatureCable.__table__
+    sensors = TemperatureSensor.__table__
+
+    bin_ids = select(bins.c.id).where(bins.c.device_id.in_(device_ids))
+    cable_ids = select(cables.c.id).where(cables.c.grainbin_id.in_(bin_ids))
+
+    cable_sensors = defaultdict(list)
+    for row in _select_rows(session, sensors, sensors.c.cable_id.in_(cable_ids)):
+        cable_sensors[row.cable_id].append(TemperatureSensorSnapshot._make(row))
+
+    bin_cables = defaultdict(list)
+    for row in _select_rows(session, cables, cables.c.id.in_(cable_ids)):
+        bin_cables[row.grainbin_id].append(
+            TemperatureCableSnapshot(*row, tuple(cable_sensors[row.id]))
+        )
+
+    device_bins = defaultdict(list)
+    for row in _select_rows(session, bins, bins.c.id.in_(bin_ids)):
+        device_bins[row.device_id].append(
+            GrainbinSnapshot(*row, tuple(bin_cables[row.id]))
+        )
+
+    return [
+        DeviceSnapshot(*row, tuple(device_bins[row.id]))
+        for row in _select_rows(session, devices, devices.c.id.in_(device_ids))
+    ]
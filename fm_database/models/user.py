@@ -1,18 +1,31 @@
 # -*- coding: utf-8 -*-
 """A user model."""
+import asyncio
 import datetime as dt
 
-from sqlalchemy import Boolean, Column, DateTime, ForeignKey, Integer, String, Table
+from sqlalchemy import (
+    Boolean,
+    Column,
+    DateTime,
+    ForeignKey,
+    Index,
+    Integer,
+    String,
+    Table,
+    event,
+)
 from sqlalchemy.orm import relationship
 
 from ..database import SurrogatePK
-from ..extensions import pwd_context
+from ..extensions import get_pwd_context
 
+# the primary key serves the roles of a user and the index the users of a role
 user_roles = Table(
     "user_roles",
     SurrogatePK.metadata,
-    Column("role_id", Integer, ForeignKey("roles.id")),
-    Column("user_id", Integer, ForeignKey("users.id")),
+    Column("user_id", Integer, ForeignKey("users.id"), primary_key=True),
+    Column("role_id", Integer, ForeignKey("roles.id"), primary_key=True),
+    Index("ix_user_roles_role_id", "role_id"),
 )
 
 
@@ -21,7 +34,7 @@ class Role(SurrogatePK):
 
     __tablename__ = "roles"
     name = Column(String(80), unique=True, nullable=False)
-    users = relationship("User", secondary=user_roles, backref="roles")
+    users = relationship("User", secondary=user_roles, back_populates="roles")
 
     def __init__(self, name, **kwargs):
         """Create instance."""
@@ -46,6 +59,11 @@ class User(SurrogatePK):
     active = Column(Boolean(), nullable=False, default=True)
     is_admin = Column(Boolean(), nullable=False, default=False)
 
+    roles = relationship("Role", secondary=user_roles, back_populates="users")
+
+    # names of the roles, cached by role_names until the roles change
+    _role_names = None
+
     def __init__(self, username, email, password=None, **kwargs):
         """Create instance."""
         super().__init__(username=username, email=email, **kwargs)
@@ -56,11 +74,57 @@ class User(SurrogatePK):
 
     def set_password(self, password):
         """Set password."""
-        self.password = pwd_context.hash(password)
+        self.password = get_pwd_context().hash(password)
 
     def check_password(self, value):
-        """Check password."""
-        return pwd_context.verify(value, self.password)
+        """Check password.
+
+        If the password is correct but the hash is outdated it is replaced
+        with a new hash. The change is saved with the next commit.
+        """
+        valid, new_hash = get_pwd_context().verify_and_update(value, self.password)
+        if new_hash is not None:
+            self.password = new_hash
+        return valid
+
+    async def aset_password(self, password):
+        """Set password, hashing it in a worker thread of the event loop."""
+        loop = asyncio.get_running_loop()
+        self.password = await loop.run_in_executor(
+            None, get_pwd_context().hash, password
+        )
+
+    async def acheck_password(self, value):
+        """Check password in a worker thread of the event loop.
+
+        Outdated hashes are replaced like in check_password.
+        """
+        loop = asyncio.get_running_loop()
+        valid, new_hash = await loop.run_in_executor(
+            None, get_pwd_context().verify_and_update, value, self.password
+        )
+        if new_hash is not None:
+            self.password = new_hash
+        return valid
+
+    @property
+    def role_names(self):
+        """Return the set of the names of the user's roles.
+
+        The set is cached on the instance until the roles are changed or
+        the instance is expired or refreshed.
+        """
+        if self._role_names is None:
+            self._role_names = frozenset(role.name for role in self.roles)
+        return self._role_names
+
+    def has_role(self, name):
+        """Return True if the user has the role with the name."""
+        return name in self.role_names
+
+    def has_any_role(self, *names):
+        """Return True if the user has any of the roles with the names."""
+        return not self.role_names.isdisjoint(names)
 
     @property
     def full_name(self):
@@ -96,3 +160,18 @@ class User(SurrogatePK):
     def __repr__(self):
         """Represent instance as a unique string."""
         return "<User({username!r})>".format(username=self.username)
+
+
+@event.listens_for(User.roles, "append")
+@event.listens_for(User.roles, "remove")
+@event.listens_for(User.roles, "bulk_replace")
+def _roles_changed(target, *args):  # pylint: disable=unused-argument
+    """Drop the cached role names when the roles of a user change."""
+    target._role_names = None  # pylint: disable=protected-access
+
+
+@event.listens_for(User, "expire")
+@event.listens_for(User, "refresh")
+def _user_reloaded(target, *args):  # pylint: disable=unused-argument
+    """Drop the cached role names when the user is expired or refreshed."""
+    target._role_names = None  # pylint: disable=protected-access
@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+"""Bulk load rows with the Postgres COPY command."""
+import datetime as dt
+import io
+from itertools import chain
+
+try:
+    from psycopg2.extensions import Binary as PsycopgBinary  # type: ignore [import]
+except ImportError:  # pragma: no cover
+    PsycopgBinary = None
+
+_ESCAPES = str.maketrans({"\\": "\\\\", "\t": "\\t", "\n": "\\n", "\r": "\\r"})
+
+
+def format_value(value):
+    """Return a bound value as a field of the COPY text format."""
+    if value is None:
+        return "\\N"
+    if PsycopgBinary is not None and isinstance(value, PsycopgBinary):
+        # the psycopg2 bind processor of binary types wraps the bytes to
+        # render a SQL literal, COPY needs the bytes themselves
+        value = value.adapted
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, dt.timedelta):
+        return f"{value.total_seconds()} seconds"
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        # bytea hex format, with the backslash escaped for COPY
+        return "\\\\x" + bytes(value).hex()
+    if isinstance(value, (dt.datetime, dt.date, dt.time)):
+        return value.isoformat()
+    return str(value).translate(_ESCAPES)
+
+
+class RowReader(io.TextIOBase):
+    """A file object that reads lines from an iterator as they are needed.
+
+    Only about one read size of lines is buffered, so COPY can stream an
+    iterator of any length.
+    """
+
+    def __init__(self, lines):
+        """Create the reader."""
+        super().__init__()
+        self._lines = iter(lines)
+        self._buffer = ""
+
+    def readable(self):
+        """Return True, the reader can be read."""
+        return True
+
+    def read(self, size=-1):
+        """Return up to size characters, or everything that is left."""
+        chunks = [self._buffer]
+        length = len(self._buffer)
+        for line in self._lines:
+            chunks.append(line)
+            length += len(line)
+            if 0 <= size <= length:
+                break
+        data = "".join(chunks)
+        if size < 0:
+            self._buffer = ""
+            return data
+        self._buffer = data[size:]
+        return data[:size]
+
+
+def _python_defaults(table, columns):
+    """Return functions for the Python side defaults of the columns not in columns.
+
+    COPY does not apply sqlalchemy column defaults, so scalar and callable
+    defaults are filled in like an INSERT does. SQL expression defaults
+    cannot be sent through COPY, so those columns must be in the rows.
+    """
+    defaults = {}
+    for column in table.columns:
+        default = column.default
+        if column.name in columns or default is None:
+            continue
+        if default.is_scalar:
+            defaults[column.name] = lambda arg=default.arg: arg
+        elif default.is_callable:
+            defaults[column.name] = lambda arg=default.arg: arg(None)
+    return defaults
+
+
+def copy_lines(table, columns, rows, dialect, defaults=None):
+    """Yield rows of column values as lines of the COPY text format.
+
+    The values are bound with the column types first, so type decorators
+    like PayloadType are applied as they are for an INSERT. defaults maps
+    the names of the columns that are not in the rows to functions that
+    return their values.
+    """
+    defaults = defaults or {}
+    names = list(columns) + list(defaults)
+    processors = [
+        table.c[name].type.dialect_impl(dialect).bind_processor(dialect)
+        for name in names
+    ]
+    for row in rows:
+        fields = []
+        for name, processor in zip(names, processors):
+            value = defaults[name]() if name in defaults else row[name]
+            if processor is not None:
+                value = processor(value)
+            fields.append(format_value(value))
+        yield "\t".join(fields) + "\n"
+
+
+def copy_rows(connection, table, rows, columns=None):
+    """Load rows into a table with COPY FROM STDIN and return the row count.
+
+    connection must be a sqlalchemy connection to Postgres that uses
+    psycopg2. Rows are dictionaries of column values that all have the same
+    keys, read lazily from any iterable. The columns default to the keys of
+    the first row.
+    """
+    rows = iter(rows)
+    first = next(rows, None)
+    if first is None:
+        return 0
+    if columns is None:
+        columns = list(first)
+    defaults = _python_defaults(table, columns)
+
+    count = 0
+
+    def counted():
+        nonlocal count
+        for row in chain([first], rows):
+            count += 1
+            yield row
+
+    preparer = connection.dialect.identifier_preparer
+    statement = "COPY {} ({}) FROM STDIN".format(
+        preparer.format_table(table),
+        ", ".join(preparer.quote(name) for name in [*columns, *defaults]),
+    )
+    lines = copy_lines(table, columns, counted(), connection.dialect, defaults)
+    cursor = connection.connection.cursor()
+    try:
+        cursor.copy_expert(statement, RowReader(lines))
+    finally:
+        cursor.close()
+    return count
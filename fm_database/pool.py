@@ -0,0 +1,190 @@
+# -*- coding: utf-8 -*-
+"""Connection pool configuration and statistics."""
+import threading
+import time
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.pool import (
+    AsyncAdaptedQueuePool,
+    NullPool,
+    QueuePool,
+    SingletonThreadPool,
+    StaticPool,
+)
+
+from .codecs import json_deserializer, json_serializer
+
+
+class PoolStatistics:
+    """Live counters for the connections handed out by a pool."""
+
+    def __init__(self):
+        """Create the instance."""
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Set all counters back to zero."""
+        with self._lock:
+            self.connects = 0
+            self.checkouts = 0
+            self.checkins = 0
+            self.invalidations = 0
+            self.timeouts = 0
+            self.waits = 0
+            self.total_wait = 0.0
+            self.max_wait = 0.0
+
+    def attach(self, engine):
+        """Listen to the pool events of the engine."""
+        event.listen(engine, "connect", self._on_connect)
+        event.listen(engine, "checkout", self._on_checkout)
+        event.listen(engine, "checkin", self._on_checkin)
+        event.listen(engine, "invalidate", self._on_invalidate)
+
+    def record_wait(self, seconds, timed_out=False):
+        """Record how long a caller waited to get a connection from the pool."""
+        with self._lock:
+            self.waits += 1
+            self.total_wait += seconds
+            self.max_wait = max(self.max_wait, seconds)
+            if timed_out:
+                self.timeouts += 1
+
+    def as_dict(self):
+        """Return the counters as a dictionary."""
+        with self._lock:
+            return {
+                "connects": self.connects,
+                "checkouts": self.checkouts,
+                "checked_out": self.checkouts - self.checkins,
+                "invalidations": self.invalidations,
+                "timeouts": self.timeouts,
+                "avg_wait": self.total_wait / self.waits if self.waits else 0.0,
+                "max_wait": self.max_wait,
+            }
+
+    # pylint: disable=unused-argument
+    def _on_connect(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.connects += 1
+
+    def _on_checkout(self, dbapi_connection, connection_record, connection_proxy):
+        with self._lock:
+            self.checkouts += 1
+
+    def _on_checkin(self, dbapi_connection, connection_record):
+        with self._lock:
+            self.checkins += 1
+
+    def _on_invalidate(self, dbapi_connection, connection_record, exception):
+        with self._lock:
+            self.invalidations += 1
+
+
+class TimedQueuePool(QueuePool):
+    """A QueuePool that records how long each checkout waits for a connection."""
+
+    statistics = None
+
+    def _do_get(self):
+        """Get a connection from the pool and record the wait."""
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            timed_out = True
+            raise
+        finally:
+            if self.statistics is not None:
+                self.statistics.record_wait(time.perf_counter() - start, timed_out)
+
+    def recreate(self):
+        """Return a new pool that keeps reporting to the same statistics."""
+        pool = super().recreate()
+        pool.statistics = self.statistics
+        return pool
+
+
+class TimedAsyncAdaptedQueuePool(TimedQueuePool, AsyncAdaptedQueuePool):
+    """The asyncio version of TimedQueuePool."""
+
+
+SQLITE_POOLS = {
+    "null": NullPool,
+    "singleton": SingletonThreadPool,
+    "static": StaticPool,
+    "queue": TimedQueuePool,
+}
+
+
+def _queue_pool_options(config):
+    """Return the create_engine options for a queue pool."""
+    return {
+        "poolclass": TimedQueuePool,
+        "pool_size": config.SQLALCHEMY_POOL_SIZE,
+        "max_overflow": config.SQLALCHEMY_MAX_OVERFLOW,
+        "pool_timeout": config.SQLALCHEMY_POOL_TIMEOUT,
+        "pool_recycle": config.SQLALCHEMY_POOL_RECYCLE,
+        "pool_pre_ping": config.SQLALCHEMY_POOL_PRE_PING,
+    }
+
+
+def get_engine_options(config):
+    """Return the create_engine keyword arguments for the pool profile of a config."""
+    url = make_url(config.SQLALCHEMY_DATABASE_URI)
+    if url.get_backend_name() != "sqlite":
+        options = _queue_pool_options(config)
+        options["json_serializer"] = json_serializer
+        options["json_deserializer"] = json_deserializer
+        return options
+
+    pool_name = config.SQLALCHEMY_SQLITE_POOL
+    if pool_name is None:
+        return {}
+    if pool_name not in SQLITE_POOLS:
+        raise ValueError(f"Unknown sqlite pool '{pool_name}'")
+
+    if pool_name == "queue":
+        options = _queue_pool_options(config)
+    else:
+        options = {
+            "poolclass": SQLITE_POOLS[pool_name],
+            "pool_pre_ping": config.SQLALCHEMY_POOL_PRE_PING,
+        }
+    if pool_name in ("static", "queue"):
+        # connections are shared between threads with these pools
+        options["connect_args"] = {"check_same_thread": False}
+    return options
+
+
+def get_async_engine_options(config):
+    """Return the create_async_engine keyword arguments for the pool profile of a config."""
+    options = get_engine_options(config)
+    if options.get("poolclass") is TimedQueuePool:
+        options["poolclass"] = TimedAsyncAdaptedQueuePool
+    return options
+
+
+def get_pool_status(engine, statistics=None):
+    """Return the current state of the engine's pool as a dictionary."""
+    pool = engine.pool
+    status = {"pool": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        status.update(
+            {
+                "size": pool.size(),
+                "checked_in": pool.checkedin(),
+                "checked_out": pool.checkedout(),
+                "overflow": pool.overflow(),
+                "timeout": pool.timeout(),
+            }
+        )
+    if statistics is not None:
+        counters = statistics.as_dict()
+        status.setdefault("checked_out", counters["checked_out"])
+        del counters["checked_out"]
+        status.update(counters)
+    return status
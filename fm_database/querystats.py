@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+"""Statement statistics and a slow query log from engine events."""
+import json
+import logging
+import os
+import re
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from sqlalchemy import event
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# latencies kept per statement for the percentiles
+SAMPLE_SIZE = 1000
+
+_PLACEHOLDER = r"(?:\?|%\(\w+\)s|%s|:\w+|\$\d+)"
+_PLACEHOLDER_LIST = re.compile(
+    rf"\(\s*{_PLACEHOLDER}(?:\s*,\s*{_PLACEHOLDER})+\s*\)", re.IGNORECASE
+)
+_WHITESPACE = re.compile(r"\s+")
+
+# the QueryCounters of the count_queries blocks that are active in this context
+_active_counters = ContextVar("active_query_counters", default=())
+
+
+def fingerprint(statement):
+    """Return the statement with its whitespace and placeholder lists collapsed.
+
+    Statements that only differ in the number of values of an IN list or
+    VALUES clause get the same fingerprint.
+    """
+    statement = _WHITESPACE.sub(" ", statement).strip()
+    return _PLACEHOLDER_LIST.sub("(?, ...)", statement)
+
+
+class _StatementStats:  # pylint: disable=too-few-public-methods
+    """The counters of one statement fingerprint."""
+
+    def __init__(self):
+        """Create the instance."""
+        self.count = 0
+        self.total = 0.0
+        self.rows = 0
+        self.latencies = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, seconds, rows):
+        """Count an execution."""
+        self.count += 1
+        self.total += seconds
+        self.rows += rows
+        self.latencies.append(seconds)
+
+    def as_dict(self):
+        """Return the counters as a dictionary."""
+        latencies = sorted(self.latencies)
+        if len(latencies) > 1:
+            p99 = statistics.quantiles(latencies, n=100, method="inclusive")[98]
+        else:
+            p99 = latencies[0] if latencies else 0.0
+        return {
+            "count": self.count,
+            "total": self.total,
+            "avg": self.total / self.count if self.count else 0.0,
+            "p99": p99,
+            "rows": self.rows,
+            "latencies": list(self.latencies),
+        }
+
+
+@contextmanager
+def _file_lock(path):
+    """Hold an exclusive lock on a file, created if needed, inside the block."""
+    if fcntl is None:  # pragma: no cover
+        yield
+        return
+    with open(path, "a", encoding="utf-8") as file:
+        fcntl.flock(file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(file, fcntl.LOCK_UN)
+
+
+class QueryStatistics:
+    """Per statement fingerprint counters for the statements an engine executes.
+
+    Each fingerprint keeps its execution count, total, average and p99
+    latency in seconds and the rows reported by the cursor. The p99 is taken
+    from the last SAMPLE_SIZE executions. Rows are the DBAPI rowcount, which
+    some drivers, like sqlite3, do not report for SELECT statements.
+    Statements slower than slow_seconds are logged as warnings.
+    """
+
+    def __init__(self, slow_seconds=None):
+        """Create the instance."""
+        self.slow_seconds = slow_seconds
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        """Forget all statements."""
+        with self._lock:
+            self._statements = {}
+
+    def attach(self, engine):
+        """Listen to the cursor events of the engine."""
+        event.listen(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.listen(engine, "handle_error", self._handle_error)
+
+    def detach(self, engine):
+        """Stop listening to the cursor events of the engine."""
+        event.remove(engine, "before_cursor_execute", self._before_cursor_execute)
+        event.remove(engine, "after_cursor_execute", self._after_cursor_execute)
+        event.remove(engine, "handle_error", self._handle_error)
+
+    def record(self, statement, seconds, rows=0):
+        """Count an execution of a statement."""
+        key = fingerprint(statement)
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                stats = self._statements[key] = _StatementStats()
+            stats.add(seconds, rows)
+        if self.slow_seconds is not None and seconds >= self.slow_seconds:
+            logger.warning("slow query (%.3fs): %s", seconds, key)
+
+    def as_dict(self):
+        """Return the counters of each fingerprint as a dictionary."""
+        with self._lock:
+            return {key: stats.as_dict() for key, stats in self._statements.items()}
+
+    def top(self, number=10, order_by="total"):
+        """Return (fingerprint, counters) of the number of statements with the most order_by."""
+        statements = sorted(
+            self.as_dict().items(), key=lambda item: item[1][order_by], reverse=True
+        )
+        return statements[:number]
+
+    def load(self, path):
+        """Add the counters stored in a file by dump."""
+        with open(path, encoding="utf-8") as file:
+            stored = json.load(file)
+        for key, counters in stored.items():
+            self._merge(key, counters)
+
+    def dump(self, path):
+        """Add the counters to the ones stored in a file, creating it if needed.
+
+        Processes that dump to the same file add up their counters. The read,
+        merge and replace hold an exclusive lock on path + ".lock", so
+        processes that exit at the same time do not lose counters. There is
+        no lock where fcntl is not available.
+        """
+        with _file_lock(f"{path}.lock"):
+            merged = QueryStatistics()
+            if os.path.exists(path):
+                merged.load(path)
+            for key, counters in self.as_dict().items():
+                merged._merge(key, counters)  # pylint: disable=protected-access
+            temporary = f"{path}.{os.getpid()}.{threading.get_ident()}"
+            with open(temporary, "w", encoding="utf-8") as file:
+                json.dump(merged.as_dict(), file)
+            os.replace(temporary, path)
+
+    def _merge(self, key, counters):
+        """Add the counters of a fingerprint as returned by as_dict."""
+        with self._lock:
+            stats = self._statements.get(key)
+            if stats is None:
+                stats = self._statements[key] = _StatementStats()
+            stats.count += counters["count"]
+            stats.total += counters["total"]
+            stats.rows += counters["rows"]
+            stats.latencies.extend(counters["latencies"])
+
+    # pylint: disable=unused-argument,too-many-arguments
+    def _before_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        conn.info.setdefault("query_start_time", []).append(time.perf_counter())
+
+    def _after_cursor_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ):
+        seconds = time.perf_counter() - conn.info["query_start_time"].pop()
+        rows = max(cursor.rowcount, 0)
+        self.record(statement, seconds, rows)
+
+    @staticmethod
+    def _handle_error(exception_context):
+        # a failed statement never reaches after_cursor_execute
+        connection = exception_context.connection
+        if connection is not None and connection.info.get("query_start_time"):
+            connection.info["query_start_time"].pop()
+
+
+class QueryCounter:  # pylint: disable=too-few-public-methods
+    """The statements executed inside a count_queries block."""
+
+    def __init__(self):
+        """Create the instance."""
+        self.statements = []
+
+    @property
+    def count(self):
+        """Return the number of statements executed."""
+        return len(self.statements)
+
+
+# pylint: disable=unused-argument,too-many-arguments
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    """Add the statement to the counters that are active in this context."""
+    for counter in _active_counters.get():
+        counter.statements.append(statement)
+
+
+@contextmanager
+def count_queries(engine):
+    """Count the statements the engine executes inside the block.
+
+    Yields a QueryCounter. Only statements executed by the current thread,
+    or asyncio task, are counted. Blocks can be nested.
+    """
+    if not event.contains(engine, "before_cursor_execute", _count_statement):
+        event.listen(engine, "before_cursor_execute", _count_statement)
+    counter = QueryCounter()
+    token = _active_counters.set(_active_counters.get() + (counter,))
+    try:
+        yield counter
+    finally:
+        _active_counters.reset(token)
+
+
+@contextmanager
+def assert_max_queries(number, engine):
+    """Raise AssertionError if the block executes more than number statements.
+
+    Use it in tests to catch N+1 queries, for example lazy loading a
+    relationship for each instance in a loop.
+    """
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > number:
+        statements = "\n".join(counter.statements)
+        raise AssertionError(
+            f"{counter.count} statements executed, expected at most {number}:\n"
+            f"{statements}"
+        )
+
+
+@contextmanager
+def query_budget(number, engine, name="block"):
+    """Log a warning if the block executes more than number statements."""
+    with count_queries(engine) as counter:
+        yield counter
+    if counter.count > number:
+        logger.warning(
+            "%s executed %d statements, over its budget of %d",
+            name,
+            counter.count,
+            number,
+        )
@@ -11,6 +11,45 @@ class Config:  # pylint: disable=too-few-public-methods
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
     SQLALCHEMY_DATABASE_URI = "postgresql://fm:farm_monitor@fm_db/farm_monitor.db"
+    # None derives the asyncio URI from SQLALCHEMY_DATABASE_URI
+    SQLALCHEMY_ASYNC_DATABASE_URI = None
+
+    # Connection pool profile. See fm_database.pool.get_engine_options
+    SQLALCHEMY_POOL_SIZE = 5
+    SQLALCHEMY_MAX_OVERFLOW = 10
+    SQLALCHEMY_POOL_TIMEOUT = 30
+    SQLALCHEMY_POOL_RECYCLE = 1800
+    SQLALCHEMY_POOL_PRE_PING = True
+    # One of 'null', 'singleton', 'static' or 'queue'. None uses the sqlalchemy default
+    SQLALCHEMY_SQLITE_POOL = None
+
+    # Message payload encoding. See fm_database.codecs.PayloadType
+    MESSAGE_PAYLOAD_CODEC = "json"  # 'json' or 'msgpack'
+    MESSAGE_PAYLOAD_COMPRESSION = "zlib"  # None, 'zlib' or 'zstd'
+    MESSAGE_PAYLOAD_COMPRESS_THRESHOLD = 1024
+
+    # Process level cache behind SurrogatePK.get_by_id. See fm_database.cache
+    # A size of 0 disables it. Entries changed by another process can be
+    # served for up to the TTL in seconds.
+    IDENTITY_CACHE_SIZE = 0
+    IDENTITY_CACHE_TTL = 60
+
+    # Readings received this many seconds ago or less are left for the next
+    # rollup refresh. Must be longer than the longest ingest transaction.
+    # See fm_database.models.rollup.refresh_rollups
+    ROLLUP_GRACE_SECONDS = 30
+
+    # pbkdf2_sha256 rounds for new password hashes. None uses the passlib default
+    PASSWORD_HASH_ROUNDS = None
+
+    # Statement statistics collected from engine events. See fm_database.querystats
+    QUERY_STATS = False
+    # Statements slower than this many seconds are logged. None logs nothing
+    SLOW_QUERY_SECONDS = None
+    # The statistics of each process are added to this file when it exits
+    QUERY_STATS_FILE = None
+    # A session_scope that executes more statements logs a warning. None is unlimited
+    SESSION_QUERY_BUDGET = None
 
 
 class ProdConfig(Config):  # pylint: disable=too-few-public-methods
@@ -19,6 +58,9 @@ class ProdConfig(Config):  # pylint: disable=too-few-public-methods
     ENV = "prod"
     DEBUG = False
 
+    SQLALCHEMY_POOL_SIZE = 10
+    SQLALCHEMY_MAX_OVERFLOW = 20
+
 
 class DevConfig(Config):  # pylint: disable=too-few-public-methods
     """Development configuration."""
@@ -26,6 +68,9 @@ class DevConfig(Config):  # pylint: disable=too-few-public-methods
     ENV = "dev"
     DEBUG = True
 
+    SQLALCHEMY_POOL_SIZE = 2
+    SQLALCHEMY_MAX_OVERFLOW = 5
+
 
 class TestConfig(Config):  # pylint: disable=too-few-public-methods
     """Test configuration."""
@@ -33,6 +78,10 @@ class TestConfig(Config):  # pylint: disable=too-few-public-methods
     TESTING = True
     DEBUG = True
     SQLALCHEMY_DATABASE_URI = "sqlite:////tmp/fm_monitor_test_db.sqlite"
+    SQLALCHEMY_SQLITE_POOL = "null"
+    SQLALCHEMY_POOL_PRE_PING = False
+    # cheap hashes keep the tests fast. Never use this outside of tests
+    PASSWORD_HASH_ROUNDS = 1000
 
 
 def get_config(override_default=None):
@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+"""Stream tables to and from NDJSON, CSV and Parquet files."""
+import base64
+import csv
+import datetime as dt
+import json
+import os
+
+from sqlalchemy import (
+    Boolean,
+    Date,
+    DateTime,
+    Float,
+    Integer,
+    Interval,
+    LargeBinary,
+    func,
+    insert,
+    select,
+    text,
+)
+
+from .base import get_base
+from .codecs import PayloadType
+from .database import chunked
+
+try:
+    import pyarrow  # type: ignore [import]
+    import pyarrow.parquet  # type: ignore [import]
+except ImportError:  # pragma: no cover
+    pyarrow = None
+
+FORMATS = ("ndjson", "csv", "parquet")
+
+
+class _ColumnCodec:
+    """Convert the values of a column to and from their file representation.
+
+    Values are written as JSON values: datetimes as ISO 8601 strings,
+    intervals as seconds, bytes as base64 and payloads as they are. CSV cells
+    hold the same values as text, with payloads and booleans as JSON text and
+    an empty cell for NULL.
+    """
+
+    def __init__(self, column):
+        """Create the codec."""
+        self.name = column.name
+        self.type = column.type
+
+    def dump(self, value):
+        """Return the JSON value of a column value."""
+        if value is None or isinstance(self.type, PayloadType):
+            return value
+        if isinstance(self.type, (DateTime, Date)):
+            return value.isoformat()
+        if isinstance(self.type, Interval):
+            return value.total_seconds()
+        if isinstance(self.type, LargeBinary):
+            return base64.b64encode(value).decode()
+        return value
+
+    def load(self, value):
+        """Return the column value of a JSON value."""
+        if value is None or isinstance(self.type, PayloadType):
+            return value
+        if isinstance(self.type, DateTime):
+            return dt.datetime.fromisoformat(value)
+        if isinstance(self.type, Date):
+            return dt.date.fromisoformat(value)
+        if isinstance(self.type, Interval):
+            return dt.timedelta(seconds=value)
+        if isinstance(self.type, LargeBinary):
+            return base64.b64decode(value)
+        return value
+
+    def dump_csv(self, value):
+        """Return the CSV cell of a column value."""
+        value = self.dump(value)
+        if value is None:
+            return ""
+        if isinstance(self.type, PayloadType) or isinstance(value, bool):
+            return json.dumps(value)
+        return value
+
+    def load_csv(self, value):
+        """Return the column value of a CSV cell."""
+        if value == "":
+            return None
+        if isinstance(self.type, (PayloadType, Boolean)):
+            value = json.loads(value)
+        elif isinstance(self.type, Integer):
+            value = int(value)
+        elif isinstance(self.type, (Float, Interval)):
+            value = float(value)
+        return self.load(value)
+
+    def arrow_type(self):
+        """Return the Parquet column type. Other values are stored as JSON text."""
+        if isinstance(self.type, Integer):
+            return pyarrow.int64()
+        if isinstance(self.type, Float):
+            return pyarrow.float64()
+        if isinstance(self.type, Boolean):
+            return pyarrow.bool_()
+        if isinstance(self.type, DateTime):
+            return pyarrow.timestamp("us")
+        return pyarrow.string()
+
+    def dump_arrow(self, value):
+        """Return the Parquet value of a column value."""
+        if value is None or isinstance(self.type, (Integer, Float, Boolean, DateTime)):
+            return value
+        return json.dumps(self.dump(value))
+
+    def load_arrow(self, value):
+        """Return the column value of a Parquet value."""
+        if value is None or isinstance(self.type, (Integer, Float, Boolean, DateTime)):
+            return value
+        return self.load(json.loads(value))
+
+
+def get_tables(table_names=None):
+    """Return the tables with the names, or all tables, parents before children."""
+    tables = get_base().metadata.sorted_tables
+    if not table_names:
+        return tables
+    unknown = set(table_names) - {table.name for table in tables}
+    if unknown:
+        raise ValueError(f"Unknown tables: {', '.join(sorted(unknown))}")
+    return [table for table in tables if table.name in table_names]
+
+
+def table_path(directory, table, fmt):
+    """Return the path of the file a table is exported to."""
+    return os.path.join(directory, f"{table.name}.{fmt}")
+
+
+def _open(path, mode, fmt):
+    """Open a file in text mode, or binary mode for Parquet."""
+    if fmt == "parquet":
+        return open(path, mode + "b")  # pylint: disable=consider-using-with
+    return open(path, mode, newline="", encoding="utf-8")
+
+
+def _check_format(fmt):
+    """Raise if the file format can not be used."""
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown format '{fmt}'")
+    if fmt == "parquet" and pyarrow is None:
+        raise RuntimeError("The parquet format needs the 'pyarrow' package")
+
+
+def export_table(connection, table, path, fmt="ndjson", batch_size=1000):
+    """Write the rows of a table to a file and return the number of rows.
+
+    Rows are streamed with a server side cursor where the database supports
+    it and written batch_size rows at a time, so memory use does not grow
+    with the size of the table.
+    """
+    _check_format(fmt)
+    codecs = [_ColumnCodec(column) for column in table.columns]
+    result = connection.execution_options(
+        stream_results=True, max_row_buffer=batch_size
+    ).execute(select(table).order_by(*table.primary_key.columns))
+
+    count = 0
+    with _open(path, "w", fmt) as file:
+        if fmt == "ndjson":
+            for rows in result.partitions(batch_size):
+                for row in rows:
+                    record = {
+                        codec.name: codec.dump(value)
+                        for codec, value in zip(codecs, row)
+                    }
+                    file.write(json.dumps(record) + "\n")
+                count += len(rows)
+        elif fmt == "csv":
+            writer = csv.writer(file)
+            writer.writerow([codec.name for codec in codecs])
+            for rows in result.partitions(batch_size):
+                writer.writerows(
+                    [codec.dump_csv(value) for codec, value in zip(codecs, row)]
+                    for row in rows
+                )
+                count += len(rows)
+        else:
+            schema = pyarrow.schema(
+                [(codec.name, codec.arrow_type()) for codec in codecs]
+            )
+            with pyarrow.parquet.ParquetWriter(file, schema) as writer:
+                for rows in result.partitions(batch_size):
+                    columns = {
+                        codec.name: [codec.dump_arrow(row[index]) for row in rows]
+                        for index, codec in enumerate(codecs)
+                    }
+                    writer.write_table(
+                        pyarrow.Table.from_pydict(columns, schema=schema)
+                    )
+                    count += len(rows)
+    return count
+
+
+def _read_records(path, codecs, fmt, batch_size):
+    """Yield the records of a file as dictionaries of column values."""
+    by_name = {codec.name: codec for codec in codecs}
+    with _open(path, "r", fmt) as file:
+        if fmt == "ndjson":
+            for line in file:
+                if line.strip():
+                    yield {
+                        name: by_name[name].load(value)
+                        for name, value in json.loads(line).items()
+                    }
+        elif fmt == "csv":
+            for record in csv.DictReader(file):
+                yield {
+                    name: by_name[name].load_csv(value)
+                    for name, value in record.items()
+                }
+        else:
+            for batch in pyarrow.parquet.ParquetFile(file).iter_batches(batch_size):
+                for record in batch.to_pylist():
+                    yield {
+                        name: by_name[name].load_arrow(value)
+                        for name, value in record.items()
+                    }
+
+
+def _reset_sequence(connection, table):
+    """Move the id sequence of a Postgres table past the imported ids."""
+    primary_key = list(table.primary_key.columns)
+    if connection.dialect.name != "postgresql" or len(primary_key) != 1:
+        return
+    if not isinstance(primary_key[0].type, Integer):
+        return
+    column = primary_key[0]
+    max_id = connection.execute(select(func.max(column))).scalar()
+    if max_id is not None:
+        connection.execute(
+            text("SELECT setval(pg_get_serial_sequence(:table, :column), :value)"),
+            {"table": table.name, "column": column.name, "value": max_id},
+        )
+
+
+def import_table(connection, table, path, fmt="ndjson", batch_size=1000):
+    """Insert the rows of a file into a table and return the number of rows.
+
+    The file is read and inserted batch_size rows at a time. Import parent
+    tables before their children, as get_tables orders them. On Postgres the
+    id sequence is moved past the imported ids.
+    """
+    _check_format(fmt)
+    codecs = [_ColumnCodec(column) for column in table.columns]
+    statement = insert(table)
+
+    count = 0
+    for batch in chunked(_read_records(path, codecs, fmt, batch_size), batch_size):
+        connection.execute(statement, batch)
+        count += len(batch)
+    _reset_sequence(connection, table)
+    return count
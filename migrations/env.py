@@ -21,8 +21,9 @@ fileConfig(config.config_file_name)
 # add your model's MetaData object here
 # for 'autogenerate' support
 from fm_database.base import get_base
-from fm_database.models.device import Device, TemperatureSensor, TemperatureCable, Grainbin, Device
+from fm_database.models.device import Device, TemperatureSensor, TemperatureCable, Grainbin, Device, SensorReading
 from fm_database.models.message import Message
+from fm_database.models.rollup import ReadingRollup, RollupWatermark
 from fm_database.models.system import Hardware, SystemSetup, Wifi, Interface, Software
 from fm_database.models.user import User, Role
 Base = get_base()
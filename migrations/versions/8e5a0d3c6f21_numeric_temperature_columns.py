@@ -0,0 +1,105 @@
+"""numeric temperature columns
+
+Revision ID: 8e5a0d3c6f21
+Revises: 4c2f9e1b7d35
+Create Date: 2026-10-18 08:30:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8e5a0d3c6f21'
+down_revision = '4c2f9e1b7d35'
+branch_labels = None
+depends_on = None
+
+# table -> {column: length of the old string column}
+TEMPERATURE_COLUMNS = {
+    'temperature_sensor': {'templow': 4, 'temphigh': 4, 'last_value': 7},
+    'grainbin': {'average_temp': 7},
+    'device': {'interior_temp': 7, 'exterior_temp': 7, 'device_temp': 7},
+}
+
+# values that are not a number, like 'unknown', become NULL
+NUMBER_PATTERN = r'^\s*[-+]?[0-9]+(\.[0-9]+)?\s*$'
+
+
+def _to_float(value):
+    """Return the value as a float, or None if it is not a number."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _read_rows(table_name, columns):
+    """Return the id and the column values of every row of a table."""
+    table = sa.table(table_name, sa.column('id'), *[sa.column(name) for name in columns])
+    return op.get_bind().execute(sa.select(table)).fetchall()
+
+
+def _write_rows(table_name, columns, rows, convert):
+    """Write the converted column values of the rows back to the table.
+
+    The rows are read before the table is copied, because the copy casts
+    the old values to the new column type.
+    """
+    table = sa.table(table_name, sa.column('id'), *[sa.column(name) for name in columns])
+    bind = op.get_bind()
+    for row in rows:
+        values = {name: convert(name, row[name]) for name in columns}
+        bind.execute(table.update().where(table.c.id == row.id).values(**values))
+
+
+def upgrade():
+    bind = op.get_bind()
+    for table_name, columns in TEMPERATURE_COLUMNS.items():
+        if bind.dialect.name == 'postgresql':
+            for name, length in columns.items():
+                op.alter_column(table_name, name,
+                                existing_type=sa.String(length=length),
+                                type_=sa.Float(),
+                                existing_nullable=True,
+                                postgresql_using=(
+                                    f"CASE WHEN {name} ~ '{NUMBER_PATTERN}' "
+                                    f"THEN {name}::double precision END"
+                                ))
+        else:
+            # SQLite: copy the table with the new types, then parse the values
+            rows = _read_rows(table_name, columns)
+            with op.batch_alter_table(table_name) as batch_op:
+                for name, length in columns.items():
+                    batch_op.alter_column(name,
+                                          existing_type=sa.String(length=length),
+                                          type_=sa.Float(),
+                                          existing_nullable=True)
+            _write_rows(table_name, columns, rows, lambda name, value: _to_float(value))
+
+
+def downgrade():
+    bind = op.get_bind()
+    for table_name, columns in TEMPERATURE_COLUMNS.items():
+        if bind.dialect.name == 'postgresql':
+            for name, length in columns.items():
+                op.alter_column(table_name, name,
+                                existing_type=sa.Float(),
+                                type_=sa.String(length=length),
+                                existing_nullable=True,
+                                postgresql_using=f"left({name}::text, {length})")
+        else:
+            rows = _read_rows(table_name, columns)
+            with op.batch_alter_table(table_name) as batch_op:
+                for name, length in columns.items():
+                    batch_op.alter_column(name,
+                                          existing_type=sa.Float(),
+                                          type_=sa.String(length=length),
+                                          existing_nullable=True)
+            _write_rows(
+                table_name,
+                columns,
+                rows,
+                lambda name, value: None if value is None else str(value)[:columns[name]],
+            )
+    op.execute("UPDATE temperature_sensor SET last_value = 'unknown' WHERE last_value IS NULL")
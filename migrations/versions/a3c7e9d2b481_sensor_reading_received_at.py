@@ -0,0 +1,34 @@
+"""add sensor_reading.received_at for the rollup watermark
+
+Revision ID: a3c7e9d2b481
+Revises: 0b3e6f9a5c18
+Create Date: 2026-10-18 11:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3c7e9d2b481'
+down_revision = '0b3e6f9a5c18'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.add_column('sensor_reading', sa.Column('received_at', sa.DateTime(), nullable=True))
+    # the watermark of the stored rollups is a reading timestamp, so the
+    # existing readings count as received at their timestamp
+    op.execute('UPDATE sensor_reading SET received_at = timestamp')
+    with op.batch_alter_table('sensor_reading') as batch_op:
+        batch_op.alter_column('received_at',
+               existing_type=sa.DateTime(),
+               nullable=False)
+    op.create_index(op.f('ix_sensor_reading_received_at'), 'sensor_reading', ['received_at'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_sensor_reading_received_at'), table_name='sensor_reading')
+    with op.batch_alter_table('sensor_reading') as batch_op:
+        batch_op.drop_column('received_at')
@@ -0,0 +1,135 @@
+"""encode message payloads with PayloadType
+
+Revision ID: d93b47e0a2f5
+Revises: c5d8f2a61e47
+Create Date: 2026-10-18 09:15:00.000000
+
+"""
+import base64
+import datetime as dt
+import decimal
+import uuid
+
+from alembic import op
+import sqlalchemy as sa
+
+from fm_database.codecs import PayloadType
+
+
+# revision identifiers, used by Alembic.
+revision = 'd93b47e0a2f5'
+down_revision = 'c5d8f2a61e47'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 1000
+
+# the column type of the model, pinned so the config can not change it
+PAYLOAD_TYPE = PayloadType(codec='json', jsonb=True)
+
+
+def _to_json(value):
+    """Return a pickled payload value with the types JSON can not hold converted.
+
+    Datetimes, dates and times become ISO 8601 strings, bytes base64
+    strings, UUIDs strings, decimals floats, sets and tuples lists and dict
+    keys strings. Raises TypeError for any other type.
+    """
+    if value is None or isinstance(value, (bool, int, float, str)):
+        return value
+    if isinstance(value, dict):
+        return {str(key): _to_json(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return [_to_json(item) for item in value]
+    if isinstance(value, (dt.datetime, dt.date, dt.time)):
+        return value.isoformat()
+    if isinstance(value, (bytes, bytearray)):
+        return base64.b64encode(value).decode()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    raise TypeError(f'{type(value).__name__} can not be stored as JSON')
+
+
+def _message_table(from_type, to_type):
+    """Return the message table with the payload columns of the given types."""
+    return sa.table(
+        'message',
+        sa.column('id', sa.Integer()),
+        sa.column('payload', from_type),
+        sa.column('payload_new', to_type),
+    )
+
+
+def _payload_batches(message):
+    """Yield the (id, payload) rows of message in batches of BATCH_SIZE rows."""
+    bind = op.get_bind()
+    last_id = 0
+    while True:
+        rows = bind.execute(
+            sa.select(message.c.id, message.c.payload)
+            .where(message.c.id > last_id, message.c.payload.isnot(None))
+            .order_by(message.c.id)
+            .limit(BATCH_SIZE)
+        ).fetchall()
+        if not rows:
+            break
+        yield rows
+        last_id = rows[-1].id
+
+
+def _check_payloads():
+    """Raise before anything is written if a pickled payload can not become JSON."""
+    failed = []
+    for rows in _payload_batches(_message_table(sa.PickleType(), PAYLOAD_TYPE)):
+        for row in rows:
+            try:
+                _to_json(row.payload)
+            except TypeError as ex:
+                failed.append(f'{row.id} ({ex})')
+    if failed:
+        raise RuntimeError(
+            'Message payloads that can not be stored as JSON, fix or delete them '
+            'and run the upgrade again: ' + ', '.join(failed)
+        )
+
+
+def _copy_payloads(from_type, to_type, convert=None):
+    """Copy message.payload into message.payload_new, passing each value through convert."""
+    bind = op.get_bind()
+    message = _message_table(from_type, to_type)
+    for rows in _payload_batches(message):
+        bind.execute(
+            message.update()
+            .where(message.c.id == sa.bindparam('row_id'))
+            .values(payload_new=sa.bindparam('new_payload')),
+            [
+                {
+                    'row_id': row.id,
+                    'new_payload': convert(row.payload) if convert else row.payload,
+                }
+                for row in rows
+            ],
+        )
+
+
+def upgrade():
+    _check_payloads()
+    with op.batch_alter_table('message') as batch_op:
+        batch_op.add_column(sa.Column('payload_new', PAYLOAD_TYPE, nullable=True))
+    # the rows are read and written through the column types, so the
+    # pickled values are unpickled and encoded by PayloadType
+    _copy_payloads(sa.PickleType(), PAYLOAD_TYPE, _to_json)
+    with op.batch_alter_table('message') as batch_op:
+        batch_op.drop_column('payload')
+        batch_op.alter_column('payload_new', new_column_name='payload')
+
+
+def downgrade():
+    with op.batch_alter_table('message') as batch_op:
+        batch_op.add_column(sa.Column('payload_new', sa.PickleType(), nullable=True))
+    _copy_payloads(PAYLOAD_TYPE, sa.PickleType())
+    with op.batch_alter_table('message') as batch_op:
+        batch_op.drop_column('payload')
+        batch_op.alter_column('payload_new', new_column_name='payload')
@@ -0,0 +1,51 @@
+"""primary key and role index on user_roles
+
+Revision ID: f4b8d1c6e2a9
+Revises: e2a7c4b91f06
+Create Date: 2026-10-18 09:45:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f4b8d1c6e2a9'
+down_revision = 'e2a7c4b91f06'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # drop incomplete and duplicate rows so the primary key can be created.
+    # the table only has a row per user and role, so it fits in memory
+    bind = op.get_bind()
+    user_roles = sa.table(
+        'user_roles',
+        sa.column('user_id', sa.Integer()),
+        sa.column('role_id', sa.Integer()),
+    )
+    rows = bind.execute(
+        sa.select(user_roles.c.user_id, user_roles.c.role_id)
+        .where(user_roles.c.user_id.isnot(None), user_roles.c.role_id.isnot(None))
+        .distinct()
+    ).fetchall()
+    op.execute(user_roles.delete())
+
+    with op.batch_alter_table('user_roles') as batch_op:
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.alter_column('role_id', existing_type=sa.Integer(), nullable=False)
+        batch_op.create_primary_key('user_roles_pkey', ['user_id', 'role_id'])
+    op.create_index('ix_user_roles_role_id', 'user_roles', ['role_id'], unique=False)
+
+    op.bulk_insert(
+        user_roles, [{'user_id': user_id, 'role_id': role_id} for user_id, role_id in rows]
+    )
+
+
+def downgrade():
+    op.drop_index('ix_user_roles_role_id', table_name='user_roles')
+    with op.batch_alter_table('user_roles') as batch_op:
+        batch_op.drop_constraint('user_roles_pkey', type_='primary')
+        batch_op.alter_column('role_id', existing_type=sa.Integer(), nullable=True)
+        batch_op.alter_column('user_id', existing_type=sa.Integer(), nullable=True)
@@ -10,5 +10,11 @@ setup(
     version=__version__,
     packages=find_packages(exclude=["tests"]),
     install_requires=["click", "sqlalchemy", "passlib", "psycopg2"],
+    extras_require={
+        "async": ["asyncpg", "aiosqlite"],
+        "codecs": ["orjson", "msgpack", "zstandard"],
+        "parquet": ["pyarrow"],
+        "xdist": ["pytest-xdist"],
+    },
     entry_points={"console_scripts": ["fm_database = fm_database.cli.cli:entry_point"]},
 )
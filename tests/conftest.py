@@ -1,10 +1,38 @@
 # -*- coding: utf-8 -*-
 """Defines fixtures available to all tests."""
 # pylint: disable=redefined-outer-name
+import asyncio
+import os
+from functools import partial
+
 import pytest
 from _pytest.monkeypatch import MonkeyPatch
+from sqlalchemy import event
+
+from fm_database import querystats
+from fm_database.base import (
+    create_all_tables,
+    dispose_async_engines,
+    dispose_engines,
+    drop_all_tables,
+    get_engine,
+    get_session,
+    truncate_tables,
+)
+from fm_database.settings import TestConfig
+
+# one shared in-memory database that the sync and asyncio engines both open
+MEMORY_DATABASE = "/file:fm_monitor_test_db?mode=memory&cache=shared&uri=true"
 
-from fm_database.base import create_all_tables, drop_all_tables, get_session
+
+def pytest_addoption(parser):
+    """Add the database options."""
+    parser.addoption(
+        "--sqlite-memory",
+        action="store_true",
+        default=False,
+        help="Run the tests against an in-memory SQLite database.",
+    )
 
 
 @pytest.fixture(scope="session")
@@ -20,14 +48,30 @@ def monkeysession(request):
 
 
 @pytest.fixture(scope="session", autouse=True)
-def set_testing_env(monkeysession):
+def set_testing_env(monkeysession, request):
     """Set the environment variable for testing.
 
     This executes once for the entire session of testing.
     The environment variables are set back to the default after.
     Makes sure that the database env is also called and set.
+
+    Each pytest-xdist worker gets its own database file, or with
+    --sqlite-memory an in-memory database.
     """
     monkeysession.setenv("FM_DATABASE_CONFIG", "test")
+    if request.config.getoption("--sqlite-memory"):
+        monkeysession.setattr(
+            TestConfig, "SQLALCHEMY_DATABASE_URI", f"sqlite://{MEMORY_DATABASE}"
+        )
+        # the database lives as long as the one connection of the pool
+        monkeysession.setattr(TestConfig, "SQLALCHEMY_SQLITE_POOL", "static")
+    elif "PYTEST_XDIST_WORKER" in os.environ:
+        worker = os.environ["PYTEST_XDIST_WORKER"]
+        monkeysession.setattr(
+            TestConfig,
+            "SQLALCHEMY_DATABASE_URI",
+            f"sqlite:////tmp/fm_monitor_test_db_{worker}.sqlite",
+        )
     yield
     monkeysession.setenv("FM_DATABASE_CONFIG", "dev")
 
@@ -38,10 +82,73 @@ def dbsession():
     yield get_session()
 
 
-@pytest.fixture()
-def tables(dbsession):
-    """Create all tables for testing. Delete when done."""
+@pytest.fixture(scope="session")
+def database():
+    """Create all tables once for the test session. Drop them when done."""
     create_all_tables()
     yield
-    dbsession.close()
+    get_session().remove()
     drop_all_tables()
+    # the connection threads of aiosqlite would keep the process alive
+    asyncio.run(dispose_async_engines())
+    dispose_engines()
+
+
+def _begin_sqlite(connection):
+    """Emit BEGIN ourselves, the sqlite3 driver would skip it before a SAVEPOINT."""
+    connection.exec_driver_sql("BEGIN")
+
+
+@pytest.fixture()
+def tables(database, dbsession):  # pylint: disable=unused-argument
+    """Run the test in a transaction that is rolled back when it is done.
+
+    Sessions of the process, including dbsession and session_scope(), join a
+    connection whose transaction is never committed. A commit of a session
+    releases a SAVEPOINT and starts the next one. Use committed_tables for
+    tests that need other connections to see the data.
+    """
+    engine = get_engine()
+    connection = engine.connect()
+    sqlite = engine.dialect.name == "sqlite"
+    if sqlite:
+        isolation_level = connection.connection.isolation_level
+        connection.connection.isolation_level = None
+        event.listen(connection, "begin", _begin_sqlite)
+    transaction = connection.begin()
+    nested = connection.begin_nested()
+
+    def restart_savepoint(
+        session, session_transaction
+    ):  # pylint: disable=unused-argument
+        nonlocal nested
+        if not nested.is_active:
+            nested = connection.begin_nested()
+
+    session_factory = dbsession.session_factory
+    dbsession.remove()
+    session_factory.configure(bind=connection)
+    event.listen(session_factory, "after_transaction_end", restart_savepoint)
+    yield
+    event.remove(session_factory, "after_transaction_end", restart_savepoint)
+    dbsession.remove()
+    session_factory.configure(bind=engine)
+    transaction.rollback()
+    if sqlite:
+        event.remove(connection, "begin", _begin_sqlite)
+        connection.connection.isolation_level = isolation_level
+    connection.close()
+
+
+@pytest.fixture()
+def committed_tables(database, dbsession):  # pylint: disable=unused-argument
+    """Let the test commit to the tables. Delete all rows when done."""
+    yield
+    dbsession.remove()
+    truncate_tables()
+
+
+@pytest.fixture()
+def assert_max_queries():
+    """Bind assert_max_queries to the test engine."""
+    return partial(querystats.assert_max_queries, engine=get_engine())
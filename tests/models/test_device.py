@@ -3,12 +3,17 @@ import datetime as dt
 
 import pytest
 
+from fm_database import database
+from fm_database.base import get_engine
 from fm_database.models.device import (
     Device,
     Grainbin,
+    SensorReading,
     TemperatureCable,
     TemperatureSensor,
+    load_device_tree,
 )
+from fm_database.querystats import count_queries
 
 from ..factories import (
     DeviceFactory,
@@ -32,7 +37,7 @@ class TestTemperatureSensor:
         temperature_sensor.save(dbsession)
 
         assert temperature_sensor.cable_id == temperature_cable.id
-        assert temperature_sensor.last_value == "unknown"
+        assert temperature_sensor.last_value is None
 
     @staticmethod
     def test_get_temperature_sensor_by_id(dbsession):
@@ -63,11 +68,11 @@ class TestTemperatureSensor:
 
         assert temperature_sensor.templow is None
         assert temperature_sensor.temphigh is None
-        assert temperature_sensor.last_value == "unknown"
+        assert temperature_sensor.last_value is None
         assert isinstance(temperature_sensor.cable_id, int)
 
     @staticmethod
-    def test_multiple_temperature_sensors_per_cable(dbsession):
+    def test_multiple_temperature_sensors_per_cable(dbsession, assert_max_queries):
         """Test adding multiple temperature sensors to the same cable."""
         temperature_cable = TemperatureCableFactory.create(dbsession)
         temperature_cable.save(dbsession)
@@ -76,8 +81,93 @@ class TestTemperatureSensor:
             sensor = TemperatureSensor(temperature_cable.id)
             sensor.save(dbsession)
 
-        assert isinstance(temperature_cable.sensors, list)
-        assert len(temperature_cable.sensors) == 5
+        # refresh the expired cable and load its sensors
+        with assert_max_queries(2):
+            assert isinstance(temperature_cable.sensors, list)
+            assert len(temperature_cable.sensors) == 5
+
+
+@pytest.mark.usefixtures("tables")
+class TestSensorReading:
+    """SensorReading model tests."""
+
+    @staticmethod
+    def test_ingest_readings(dbsession):
+        """Ingest readings for a sensor and skip duplicates."""
+        sensor = TemperatureSensorFactory.create(dbsession)
+        sensor.save(dbsession)
+        start = dt.datetime(2021, 1, 1)
+        readings = [
+            (sensor.id, start + dt.timedelta(minutes=n), 20.0 + n) for n in range(5)
+        ]
+
+        SensorReading.ingest(dbsession, readings, batch_size=2)
+        SensorReading.ingest(dbsession, readings[:2])
+
+        assert dbsession.query(SensorReading).count() == 5
+
+    @staticmethod
+    def test_ingest_refreshes_last_value(dbsession):
+        """The last value of a sensor comes from its newest reading."""
+        sensor = TemperatureSensorFactory.create(dbsession)
+        sensor.save(dbsession)
+        other_sensor = TemperatureSensor(sensor.cable_id)
+        other_sensor.save(dbsession)
+        start = dt.datetime(2021, 1, 1)
+
+        SensorReading.ingest(
+            dbsession,
+            [
+                (sensor.id, start + dt.timedelta(minutes=1), 21.5),
+                (sensor.id, start, 19.0),
+            ],
+        )
+
+        assert sensor.last_value == 21.5
+        assert other_sensor.last_value is None
+
+    @staticmethod
+    def test_refresh_last_values_chunks(dbsession, monkeypatch):
+        """The sensors are updated in chunks that fit the parameter limit."""
+        cable = TemperatureCableFactory.create(dbsession)
+        cable.save(dbsession)
+        sensors = [TemperatureSensor(cable.id) for _ in range(3)]
+        for sensor in sensors:
+            sensor.save(dbsession)
+        start = dt.datetime(2021, 1, 1)
+        SensorReading.ingest(
+            dbsession,
+            [(sensor.id, start, 20.0 + n) for n, sensor in enumerate(sensors)],
+        )
+        dbsession.execute(TemperatureSensor.__table__.update().values(last_value=None))
+        sensor_ids = [sensor.id for sensor in sensors]
+        monkeypatch.setitem(database.MAX_BIND_PARAMS, "sqlite", 2)
+
+        with count_queries(get_engine()) as counter:
+            TemperatureSensor.refresh_last_values(dbsession, sensor_ids)
+
+        assert len(counter.statements) == 2
+        assert [sensor.last_value for sensor in sensors] == [20.0, 21.0, 22.0]
+
+    @staticmethod
+    def test_get_range(dbsession):
+        """Readings in a time range are returned oldest first."""
+        sensor = TemperatureSensorFactory.create(dbsession)
+        sensor.save(dbsession)
+        start = dt.datetime(2021, 1, 1)
+        SensorReading.ingest(
+            dbsession,
+            [(sensor.id, start + dt.timedelta(minutes=n), n) for n in range(10)],
+        )
+
+        readings = SensorReading.get_range(
+            dbsession,
+            sensor.id,
+            start + dt.timedelta(minutes=2),
+            start + dt.timedelta(minutes=5),
+        )
+
+        assert [reading.value for reading in readings] == [2, 3, 4]
 
 
 @pytest.mark.usefixtures("tables")
@@ -128,7 +218,7 @@ class TestTemperatureCable:
         assert isinstance(temperature_cable.grainbin_id, int)
 
     @staticmethod
-    def test_multiple_temperature_cables_per_bin(dbsession):
+    def test_multiple_temperature_cables_per_bin(dbsession, assert_max_queries):
         """Test adding multiple temperature cables to the same grainbin."""
         grainbin = GrainbinFactory.create(dbsession)
         grainbin.save(dbsession)
@@ -137,8 +227,10 @@ class TestTemperatureCable:
             cable = TemperatureCable(grainbin.id)
             cable.save(dbsession)
 
-        assert isinstance(grainbin.cables, list)
-        assert len(grainbin.cables) == 5
+        # refresh the expired grainbin and load its cables
+        with assert_max_queries(2):
+            assert isinstance(grainbin.cables, list)
+            assert len(grainbin.cables) == 5
 
 
 @pytest.mark.usefixtures("tables")
@@ -200,6 +292,39 @@ class TestGrainbin:
         assert isinstance(grainbin.bus_number, int)
         assert not grainbin.user_configured
 
+    @staticmethod
+    def test_grainbin_temperature_stats(dbsession):
+        """Aggregate the sensor temperatures of a grainbin."""
+        cable = TemperatureCableFactory.create(dbsession)
+        cable.save(dbsession)
+        for value in (10.0, 20.0, 30.0, None):
+            TemperatureSensor(cable.id).update(dbsession, last_value=value)
+
+        stats = Grainbin.temperature_stats(dbsession, [cable.grainbin_id])
+
+        assert len(stats) == 1
+        assert stats[0].grainbin_id == cable.grainbin_id
+        assert stats[0].min_temp == 10.0
+        assert stats[0].max_temp == 30.0
+        assert stats[0].avg_temp == 20.0
+        assert stats[0].sensor_count == 3
+
+    @staticmethod
+    def test_grainbin_refresh_average_temps(dbsession):
+        """Refresh the average temperature of grainbins from their sensors."""
+        cable = TemperatureCableFactory.create(dbsession)
+        cable.save(dbsession)
+        empty_grainbin = GrainbinFactory.create(dbsession)
+        empty_grainbin.save(dbsession)
+        for value in (10.0, 15.0):
+            TemperatureSensor(cable.id).update(dbsession, last_value=value)
+        grainbin = Grainbin.get_by_id(cable.grainbin_id, dbsession)
+
+        Grainbin.refresh_average_temps(dbsession)
+
+        assert grainbin.average_temp == 12.5
+        assert empty_grainbin.average_temp is None
+
 
 @pytest.mark.usefixtures("tables")
 class TestDevice:
@@ -266,3 +391,65 @@ class TestDevice:
         assert device.disk_total is None
         assert device.disk_used is None
         assert device.disk_free is None
+
+    @staticmethod
+    def test_device_temperature_stats(dbsession):
+        """Aggregate the sensor temperatures of all bins of a device."""
+        cable = TemperatureCableFactory.create(dbsession)
+        cable.save(dbsession)
+        grainbin = Grainbin.get_by_id(cable.grainbin_id, dbsession)
+        other_cable = TemperatureCable(grainbin.id)
+        other_cable.save(dbsession)
+        TemperatureSensor(cable.id).update(dbsession, last_value=5.0)
+        TemperatureSensor(other_cable.id).update(dbsession, last_value=7.0)
+
+        stats = Device.temperature_stats(dbsession, [grainbin.device_id])
+
+        assert len(stats) == 1
+        assert stats[0].device_id == grainbin.device_id
+        assert stats[0].min_temp == 5.0
+        assert stats[0].max_temp == 7.0
+        assert stats[0].sensor_count == 2
+
+    @staticmethod
+    def test_multiple_grainbins_per_device(dbsession, assert_max_queries):
+        """Test adding multiple grainbins to the same device."""
+        device = DeviceFactory.create(dbsession)
+        device.save(dbsession)
+
+        for bus_number in range(3):
+            Grainbin(device.id, bus_number).save(dbsession)
+
+        # refresh the expired device and load its bins
+        with assert_max_queries(2):
+            assert [grainbin.bus_number for grainbin in device.bins] == [0, 1, 2]
+
+    @staticmethod
+    def test_load_device_tree(dbsession, assert_max_queries):
+        """Whole device trees are loaded in a fixed number of queries."""
+        device_ids = []
+        for n in range(3):
+            device = Device(f"tree{n}", "1", "1")
+            device.save(dbsession)
+            device_ids.append(device.id)
+            for bus_number in range(2):
+                grainbin = Grainbin(device.id, bus_number)
+                grainbin.save(dbsession)
+                for _ in range(2):
+                    cable = TemperatureCable(grainbin.id)
+                    cable.save(dbsession)
+                    for _ in range(2):
+                        TemperatureSensor(cable.id).save(dbsession)
+        dbsession.expunge_all()
+
+        with assert_max_queries(4):
+            devices = load_device_tree(dbsession, device_ids)
+            sensor_count = sum(
+                len(cable.sensors)
+                for device in devices
+                for grainbin in device.bins
+                for cable in grainbin.cables
+            )
+
+        assert [device.id for device in devices] == device_ids
+        assert sensor_count == 24
@@ -63,3 +63,123 @@ class TestMessage:
             message.valid_from.hour == (dt.datetime.now() + dt.timedelta(days=1)).hour
         )
         assert message.valid_to.hour == (dt.datetime.now() + dt.timedelta(days=3)).hour
+
+
+@pytest.mark.usefixtures("tables")
+class TestMessageQueue:
+    """Message queue tests."""
+
+    @staticmethod
+    def test_enqueue(dbsession):
+        """Enqueue a message with a payload."""
+        message = Message.enqueue(
+            dbsession, "Source", "Destination", "Test", payload={"a": 1}
+        )
+
+        assert message.payload == {"a": 1}
+        assert message.attempts == 0
+        assert isinstance(message.valid_from, dt.datetime)
+
+    @staticmethod
+    def test_dequeue_batch(dbsession):
+        """Dequeue a batch of valid messages for a destination."""
+        for _ in range(3):
+            Message.enqueue(dbsession, "Source", "Destination", "Test")
+        Message.enqueue(dbsession, "Source", "Destination", "Other")
+        Message.enqueue(dbsession, "Source", "Elsewhere", "Test")
+        Message.enqueue(
+            dbsession,
+            "Source",
+            "Destination",
+            "Test",
+            valid_from=dt.timedelta(hours=1),
+        )
+
+        first = Message.dequeue(dbsession, "Destination", "Test", batch_size=2)
+        second = Message.dequeue(dbsession, "Destination", "Test", batch_size=2)
+        third = Message.dequeue(dbsession, "Destination", "Test", batch_size=2)
+
+        assert len(first) == 2
+        assert len(second) == 1
+        assert third == []
+        assert {message.id for message in first}.isdisjoint(
+            message.id for message in second
+        )
+        assert all(message.attempts == 1 for message in first + second)
+
+    @staticmethod
+    def test_ack(dbsession):
+        """Acked messages are never dequeued again."""
+        Message.enqueue(dbsession, "Source", "Destination", "Test")
+        messages = Message.dequeue(dbsession, "Destination", lease=dt.timedelta(0))
+
+        assert Message.ack(dbsession, messages) == 1
+        assert messages[0].acked_at is not None
+        assert Message.dequeue(dbsession, "Destination") == []
+
+    @staticmethod
+    def test_nack(dbsession):
+        """Nacked messages can be dequeued again."""
+        Message.enqueue(dbsession, "Source", "Destination", "Test")
+        messages = Message.dequeue(dbsession, "Destination")
+
+        assert Message.nack(dbsession, messages) == 1
+
+        retried = Message.dequeue(dbsession, "Destination")
+        assert [message.id for message in retried] == [messages[0].id]
+        assert retried[0].attempts == 2
+
+    @staticmethod
+    def test_expired_lease(dbsession):
+        """A message is dequeued again when its lease runs out."""
+        Message.enqueue(dbsession, "Source", "Destination", "Test")
+        first = Message.dequeue(dbsession, "Destination", lease=dt.timedelta(0))
+        first_token = first[0].lease_token
+        second = Message.dequeue(dbsession, "Destination")
+
+        assert [message.id for message in second] == [first[0].id]
+        assert second[0].lease_token != first_token
+
+
+@pytest.mark.usefixtures("tables")
+class TestMessagePurge:
+    """Message retention purge tests."""
+
+    @staticmethod
+    def _enqueue_expired(dbsession, count):
+        """Enqueue messages that have already expired."""
+        for _ in range(count):
+            Message.enqueue(
+                dbsession,
+                "Source",
+                "Destination",
+                "Test",
+                valid_from=dt.timedelta(days=-2),
+                valid_to=dt.timedelta(days=-1),
+            )
+
+    def test_purge_expired(self, dbsession):
+        """Expired messages are deleted in batches and valid ones are kept."""
+        self._enqueue_expired(dbsession, 5)
+        valid_id = Message.enqueue(dbsession, "Source", "Destination", "Test").id
+
+        assert Message.purge_expired(dbsession, batch_size=2) == 5
+        assert [message.id for message in dbsession.query(Message)] == [valid_id]
+
+    def test_purge_expired_max_batches(self, dbsession):
+        """Purging stops after max_batches."""
+        self._enqueue_expired(dbsession, 5)
+
+        assert Message.purge_expired(dbsession, batch_size=2, max_batches=2) == 4
+        assert dbsession.query(Message).count() == 1
+
+    def test_purge_expired_dry_run(self, dbsession):
+        """A dry run counts the expired messages without deleting them."""
+        self._enqueue_expired(dbsession, 3)
+
+        assert Message.purge_expired(dbsession, dry_run=True) == 3
+        limited = Message.purge_expired(
+            dbsession, batch_size=2, max_batches=1, dry_run=True
+        )
+        assert limited == 2
+        assert dbsession.query(Message).count() == 3
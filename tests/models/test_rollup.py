@@ -0,0 +1,153 @@
+"""Test reading rollup models."""
+import datetime as dt
+
+import pytest
+from sqlalchemy import func
+
+from fm_database.models.device import SensorReading, TemperatureSensor
+from fm_database.models.rollup import (
+    NO_WATERMARK,
+    ReadingRollup,
+    RollupWatermark,
+    choose_resolution,
+    refresh_rollups,
+)
+from fm_database.settings import TestConfig
+
+from ..factories import TemperatureSensorFactory
+
+START = dt.datetime(2021, 1, 1, 10, 0)
+NO_GRACE = dt.timedelta(0)
+
+
+def test_choose_resolution():
+    """The coarsest resolution with enough points is chosen."""
+    assert choose_resolution(START, START + dt.timedelta(hours=1)) == "minute"
+    assert choose_resolution(START, START + dt.timedelta(days=3)) == "hour"
+    assert choose_resolution(START, START + dt.timedelta(days=90)) == "day"
+    assert choose_resolution(START, START + dt.timedelta(days=3), 100) == "minute"
+
+
+@pytest.mark.usefixtures("tables")
+class TestReadingRollup:
+    """ReadingRollup tests."""
+
+    @staticmethod
+    def test_refresh_rollups(dbsession):
+        """Readings are rolled up per sensor, cable and grainbin."""
+        sensor = TemperatureSensorFactory.create(dbsession)
+        sensor.save(dbsession)
+        other_sensor = TemperatureSensor(sensor.cable_id)
+        other_sensor.save(dbsession)
+        SensorReading.ingest(
+            dbsession,
+            [
+                (sensor.id, START, 10.0),
+                (sensor.id, START + dt.timedelta(seconds=30), 20.0),
+                (sensor.id, START + dt.timedelta(minutes=1), 30.0),
+                (other_sensor.id, START, 40.0),
+            ],
+        )
+
+        watermark = refresh_rollups(dbsession, grace=NO_GRACE)
+
+        assert (
+            watermark == dbsession.query(func.max(SensorReading.received_at)).scalar()
+        )
+        minutes = ReadingRollup.get_range(
+            dbsession, "sensor", sensor.id, START, START + dt.timedelta(minutes=5)
+        )
+        assert [rollup.bucket for rollup in minutes] == [
+            START,
+            START + dt.timedelta(minutes=1),
+        ]
+        assert minutes[0].count == 2
+        assert minutes[0].average == 15.0
+
+        cable_hour = ReadingRollup.get_range(
+            dbsession,
+            "cable",
+            sensor.cable_id,
+            START,
+            START + dt.timedelta(days=3),
+        )
+        assert len(cable_hour) == 1
+        assert cable_hour[0].resolution == "hour"
+        assert cable_hour[0].min_value == 10.0
+        assert cable_hour[0].max_value == 40.0
+        assert cable_hour[0].count == 4
+
+    @staticmethod
+    def test_refresh_rollups_is_incremental(dbsession):
+        """Only readings received after the watermark are merged into the rollups."""
+        sensor = TemperatureSensorFactory.create(dbsession)
+        sensor.save(dbsession)
+        SensorReading.ingest(dbsession, [(sensor.id, START, 10.0)])
+        refresh_rollups(dbsession, grace=NO_GRACE)
+
+        assert refresh_rollups(dbsession, grace=NO_GRACE) is None
+
+        SensorReading.ingest(
+            dbsession,
+            [
+                (sensor.id, START + dt.timedelta(seconds=10), 2.0),
+                (sensor.id, START + dt.timedelta(seconds=20), 30.0),
+            ],
+        )
+        refresh_rollups(dbsession, grace=NO_GRACE)
+        dbsession.expire_all()
+
+        minute = dbsession.query(ReadingRollup).get(
+            ("sensor", sensor.id, "minute", START)
+        )
+        assert minute.count == 3
+        assert minute.min_value == 2.0
+        assert minute.max_value == 30.0
+        assert minute.sum_value == 42.0
+        received_at = dbsession.query(func.max(SensorReading.received_at)).scalar()
+        watermark = dbsession.query(RollupWatermark).get("sensor_reading")
+        assert watermark.watermark == received_at
+
+    @staticmethod
+    def test_refresh_rollups_late_reading(dbsession):
+        """A reading received after its bucket was rolled up is merged into it."""
+        sensor = TemperatureSensorFactory.create(dbsession)
+        sensor.save(dbsession)
+        other_sensor = TemperatureSensor(sensor.cable_id)
+        other_sensor.save(dbsession)
+        SensorReading.ingest(dbsession, [(sensor.id, START, 10.0)])
+        refresh_rollups(dbsession, grace=NO_GRACE)
+
+        SensorReading.ingest(dbsession, [(other_sensor.id, START, 20.0)])
+        assert refresh_rollups(dbsession, grace=NO_GRACE) is not None
+        dbsession.expire_all()
+
+        minute = dbsession.query(ReadingRollup).get(
+            ("cable", sensor.cable_id, "minute", START)
+        )
+        assert minute.count == 2
+        assert minute.sum_value == 30.0
+
+    @staticmethod
+    def test_refresh_rollups_grace(dbsession):
+        """Readings received in the grace period are left for the next refresh."""
+        sensor = TemperatureSensorFactory.create(dbsession)
+        sensor.save(dbsession)
+        SensorReading.ingest(dbsession, [(sensor.id, START, 10.0)])
+
+        assert refresh_rollups(dbsession, grace=dt.timedelta(minutes=5)) is None
+        assert refresh_rollups(dbsession, grace=NO_GRACE) is not None
+
+    @staticmethod
+    def test_refresh_rollups_grace_config(dbsession, monkeypatch):
+        """The grace period defaults to the ROLLUP_GRACE_SECONDS config option."""
+        sensor = TemperatureSensorFactory.create(dbsession)
+        sensor.save(dbsession)
+        SensorReading.ingest(dbsession, [(sensor.id, START, 10.0)])
+
+        assert refresh_rollups(dbsession) is None
+        watermark = dbsession.query(RollupWatermark).get("sensor_reading")
+        assert watermark.watermark == NO_WATERMARK
+
+        monkeypatch.setattr(TestConfig, "ROLLUP_GRACE_SECONDS", 0)
+        assert refresh_rollups(dbsession) is not None
@@ -0,0 +1,54 @@
+"""Test device topology snapshots."""
+import pytest
+
+from fm_database.models.device import (
+    Device,
+    Grainbin,
+    TemperatureCable,
+    TemperatureSensor,
+)
+from fm_database.models.snapshot import (
+    DeviceSnapshot,
+    TemperatureSensorSnapshot,
+    load_device_snapshots,
+)
+
+
+@pytest.mark.usefixtures("tables")
+class TestSnapshot:
+    """Snapshot tests."""
+
+    @staticmethod
+    def test_load_device_snapshots(dbsession):
+        """Snapshots hold the same data as the ORM instances."""
+        device = Device("snapshot", "1", "1")
+        device.save(dbsession)
+        Device("other", "1", "1").save(dbsession)
+        grainbin = Grainbin(device.id, 1)
+        grainbin.save(dbsession)
+        cable = TemperatureCable(grainbin.id)
+        cable.save(dbsession)
+        for value in (10.0, 20.0):
+            TemperatureSensor(cable.id).update(dbsession, last_value=value)
+
+        snapshots = load_device_snapshots(dbsession, [device.id, 999])
+
+        assert len(snapshots) == 1
+        snapshot = snapshots[0]
+        assert isinstance(snapshot, DeviceSnapshot)
+        assert snapshot.device_id == "snapshot"
+        assert snapshot.bins[0].name == grainbin.name
+        assert snapshot.bins[0].cables[0].id == cable.id
+        assert [sensor.last_value for sensor in snapshot.bins[0].cables[0].sensors] == [
+            10.0,
+            20.0,
+        ]
+
+    @staticmethod
+    def test_snapshots_are_immutable():
+        """Snapshot fields cannot be changed."""
+        sensor = TemperatureSensorSnapshot(1, None, None, 20.0, 1)
+
+        with pytest.raises(AttributeError):
+            sensor.last_value = 21.0
+        assert not hasattr(sensor, "__dict__")
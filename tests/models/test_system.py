@@ -73,7 +73,7 @@ class TestWifi:
         assert wifi.interface is None
 
     @staticmethod
-    def test_create_wifi_with_interface(dbsession):
+    def test_create_wifi_with_interface(dbsession, assert_max_queries):
         """Create a WiFi instance with an interface."""
         interface = Interface("eth0")
         interface.save(dbsession)
@@ -82,8 +82,11 @@ class TestWifi:
         wifi.interface = interface
         wifi.save(dbsession)
 
-        assert wifi.interface == interface
-        assert wifi.interface_id == interface.id
+        # refresh both expired instances and load the interface credentials
+        with assert_max_queries(3):
+            assert wifi.interface == interface
+            assert wifi.interface_id == interface.id
+            assert interface.credentials == [wifi]
 
     @staticmethod
     def test_wifi_get_by_id(dbsession):
@@ -1,9 +1,12 @@
 """Test user models."""
+import asyncio
 import datetime as dt
 
 import pytest
 
+from fm_database.extensions import get_pwd_context
 from fm_database.models.user import Role, User
+from fm_database.settings import TestConfig
 
 from ..factories import UserFactory
 
@@ -57,6 +60,41 @@ class TestUser:
         assert user.check_password("foobarbaz123") is True
         assert user.check_password("barfoobaz") is False
 
+    @staticmethod
+    def test_password_rounds():
+        """Passwords are hashed with the rounds of the config."""
+        user = User(username="foo", email="foo@bar.com", password="foobarbaz123")
+
+        assert get_pwd_context().identify(user.password) == "pbkdf2_sha256"
+        assert user.password.split("$")[2] == str(TestConfig.PASSWORD_HASH_ROUNDS)
+
+    @staticmethod
+    def test_check_password_rehashes(monkeypatch):
+        """Outdated hashes are replaced when the password is correct."""
+        user = User(username="foo", email="foo@bar.com", password="foobarbaz123")
+        old_hash = user.password
+        monkeypatch.setattr(TestConfig, "PASSWORD_HASH_ROUNDS", 2000)
+
+        assert user.check_password("barfoobaz") is False
+        assert user.password == old_hash
+        assert user.check_password("foobarbaz123") is True
+        assert user.password.split("$")[2] == "2000"
+
+    @staticmethod
+    def test_async_password(monkeypatch):
+        """Passwords are hashed and checked in a worker thread."""
+        user = User(username="foo", email="foo@bar.com")
+
+        async def run():
+            await user.aset_password("foobarbaz123")
+            wrong = await user.acheck_password("barfoobaz")
+            monkeypatch.setattr(TestConfig, "PASSWORD_HASH_ROUNDS", 2000)
+            right = await user.acheck_password("foobarbaz123")
+            return wrong, right
+
+        assert asyncio.run(run()) == (False, True)
+        assert user.password.split("$")[2] == "2000"
+
     @staticmethod
     def test_full_name(dbsession):
         """User full name."""
@@ -74,7 +112,7 @@ class TestUser:
         assert role in user.roles
 
     @staticmethod
-    def test_multiple_roles(dbsession):
+    def test_multiple_roles(dbsession, assert_max_queries):
         """Add multiple roles and users."""
         role1 = Role(name="admin")
         role1.save(dbsession)
@@ -87,8 +125,44 @@ class TestUser:
         user2 = UserFactory.create(dbsession)
         user2.roles.append(role1)
         user2.save(dbsession)
-        assert role1 in user1.roles
-        assert role2 in user1.roles
-        assert role1 in user2.roles
-        assert user1 in role1.users
-        assert user2 in role1.users
+
+        # one refresh and one roles load per user, one users load per role
+        with assert_max_queries(6):
+            assert role1 in user1.roles
+            assert role2 in user1.roles
+            assert role1 in user2.roles
+            assert user1 in role1.users
+            assert user2 in role1.users
+
+    @staticmethod
+    def test_has_role(dbsession):
+        """Role checks use the cached role names until the roles change."""
+        admin = Role(name="admin")
+        admin.save(dbsession)
+        user = UserFactory.create(dbsession)
+        user.roles.append(admin)
+        user.save(dbsession)
+
+        assert user.has_role("admin")
+        assert not user.has_role("test")
+        assert user.has_any_role("test", "admin")
+        assert not user.has_any_role("test")
+
+        test = Role(name="test")
+        user.roles.append(test)
+        assert user.has_role("test")
+        user.roles.remove(admin)
+        assert not user.has_role("admin")
+
+    @staticmethod
+    def test_role_names_reload(dbsession):
+        """Cached role names are dropped when the user is expired."""
+        user = UserFactory.create(dbsession)
+        user.save(dbsession)
+        assert user.role_names == frozenset()
+
+        role = Role(name="admin")
+        role.users.append(user)
+        role.save(dbsession)
+
+        assert user.role_names == {"admin"}
@@ -0,0 +1,78 @@
+# -*- coding: utf-8 -*-
+"""Test the asyncio engine, session scope and CRUD methods."""
+import asyncio
+
+import pytest
+
+from fm_database.base import (
+    async_session_scope,
+    get_async_database_uri,
+    get_async_engine,
+)
+from fm_database.models.device import Device
+from fm_database.settings import ProdConfig, TestConfig
+
+pytest.importorskip("aiosqlite")
+
+
+def test_async_database_uri():
+    """The asyncio driver is derived from the database URI."""
+    assert get_async_database_uri(TestConfig).startswith("sqlite+aiosqlite://")
+    assert get_async_database_uri(ProdConfig).startswith("postgresql+asyncpg://")
+
+
+def test_async_engine_is_reused():
+    """The same AsyncEngine is returned for the same config."""
+    assert get_async_engine() is get_async_engine()
+
+
+@pytest.mark.usefixtures("committed_tables")
+class TestAsyncCRUD:
+    """Asyncio CRUD tests."""
+
+    @staticmethod
+    def test_acreate_and_aget_by_id():
+        """Create a record and get it back by id."""
+
+        async def run():
+            async with async_session_scope() as session:
+                device = await Device.acreate(
+                    session,
+                    device_id="Async Device",
+                    hardware_version="1",
+                    software_version="1",
+                )
+            async with async_session_scope() as session:
+                retrieved = await Device.aget_by_id(str(device.id), session)
+                missing = await Device.aget_by_id("not an id", session)
+            return device, retrieved, missing
+
+        device, retrieved, missing = asyncio.run(run())
+
+        assert retrieved.id == device.id
+        assert retrieved.device_id == "Async Device"
+        assert missing is None
+
+    @staticmethod
+    def test_aupdate_and_adelete():
+        """Update a record and then delete it."""
+
+        async def run():
+            async with async_session_scope() as session:
+                device = await Device.acreate(
+                    session,
+                    device_id="Async Device",
+                    hardware_version="1",
+                    software_version="1",
+                )
+                await device.aupdate(session, name="updated")
+                updated = await Device.aget_by_id(device.id, session)
+                name = updated.name
+                await device.adelete(session)
+                deleted = await Device.aget_by_id(device.id, session)
+            return name, deleted
+
+        name, deleted = asyncio.run(run())
+
+        assert name == "updated"
+        assert deleted is None
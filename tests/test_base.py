@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+"""Test the engine and session registry and the table helpers."""
+import pytest
+
+from fm_database import base
+from fm_database.base import (
+    get_engine,
+    get_session,
+    session_scope,
+    truncate_tables,
+    vacuum_database,
+)
+from fm_database.models.device import Device, Grainbin
+from fm_database.models.message import Message
+from fm_database.settings import get_config
+
+from .factories import DeviceFactory, GrainbinFactory
+
+
+def test_engine_is_reused():
+    """The same engine is returned for the same config."""
+    assert get_engine() is get_engine()
+    assert get_engine() is get_engine(get_config())
+
+
+def test_session_is_reused():
+    """The same scoped session is returned for the same config."""
+    assert get_session() is get_session()
+
+
+def test_session_scope_uses_registry_engine():
+    """Each session scope gets a new session bound to the shared engine."""
+    with session_scope() as first:
+        with session_scope() as second:
+            assert first is not second
+            assert first.get_bind() is get_engine()
+            assert second.get_bind() is get_engine()
+
+
+def test_registry_resets_after_fork(monkeypatch):
+    """A new pool is used when the registry is accessed from a new process."""
+    engine = get_engine()
+    pool = engine.pool
+    db_session = get_session()
+    session = db_session()
+
+    monkeypatch.setattr(base.os, "getpid", lambda: -1)
+
+    assert get_engine() is engine
+    assert engine.pool is not pool
+    assert get_session() is db_session
+    assert db_session() is not session
+
+
+@pytest.mark.usefixtures("committed_tables")
+class TestTruncateTables:
+    """truncate_tables tests."""
+
+    @staticmethod
+    def test_truncate_selected_tables(dbsession):
+        """Selected tables are emptied along with the tables that refer to them."""
+        grainbin = GrainbinFactory.create(dbsession)
+        grainbin.save(dbsession)
+        Message.enqueue(dbsession, "Source", "Destination", "Test")
+        dbsession.close()
+
+        timings = truncate_tables(["device"])
+
+        assert [table for table, _ in timings] == [
+            "sensor_reading",
+            "temperature_sensor",
+            "temperature_cable",
+            "grainbin",
+            "device",
+        ]
+        assert dbsession.query(Device).count() == 0
+        assert dbsession.query(Grainbin).count() == 0
+        assert dbsession.query(Message).count() == 1
+
+    @staticmethod
+    def test_truncate_all_tables(dbsession):
+        """All tables are emptied and the ids start over."""
+        Message.enqueue(dbsession, "Source", "Destination", "Test")
+        dbsession.close()
+
+        truncate_tables()
+        vacuum_database()
+
+        assert dbsession.query(Message).count() == 0
+        assert Message.enqueue(dbsession, "Source", "Destination", "Test").id == 1
+
+    @staticmethod
+    def test_truncate_unknown_table():
+        """Unknown table names are rejected."""
+        with pytest.raises(ValueError):
+            truncate_tables(["nope"])
+
+
+@pytest.mark.usefixtures("tables")
+class TestTablesFixture:
+    """The tables fixture rolls back each test."""
+
+    @staticmethod
+    @pytest.mark.parametrize("number", range(2))
+    def test_commits_are_rolled_back(dbsession, number):
+        """Records committed by an earlier test are gone."""
+        assert dbsession.query(Device).count() == 0
+
+        DeviceFactory.create(dbsession).save(dbsession)
+        with session_scope() as session:
+            assert session.query(Device).count() == 1
+        message = Message.enqueue(dbsession, "Source", f"Destination{number}", "Test")
+        assert message.id == 1
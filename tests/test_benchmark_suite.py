@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Test the benchmark suite."""
+from click.testing import CliRunner
+
+from fm_database.cli.benchmark.commands import bulk_load, suite
+from fm_database.cli.benchmark.suite import (
+    CASES,
+    find_regressions,
+    load_baseline,
+    run_suite,
+    save_baseline,
+)
+
+
+def test_run_suite():
+    """Every case is timed on an in-memory database."""
+    results = run_suite("sqlite://", sizes=[20])
+
+    assert set(results) == {f"sqlite:{name}:20" for name in CASES}
+    for result in results.values():
+        assert result["ops_per_sec"] > 0
+        assert 0 <= result["p50"] <= result["p99"]
+
+
+def test_baseline(tmp_path):
+    """Results are merged into the baseline and compared with a tolerance."""
+    path = tmp_path / "baseline.json"
+    save_baseline(path, {"sqlite:create:10": {"ops_per_sec": 100.0}})
+    save_baseline(path, {"sqlite:update:10": {"ops_per_sec": 200.0}})
+    baseline = load_baseline(path)
+
+    results = {
+        "sqlite:create:10": {"ops_per_sec": 80.0},
+        "sqlite:update:10": {"ops_per_sec": 140.0},
+        "sqlite:delete:10": {"ops_per_sec": 1.0},
+    }
+    assert find_regressions(results, baseline, tolerance=0.25) == [
+        ("sqlite:update:10", 140.0, 200.0)
+    ]
+
+
+def test_suite_postgres_needs_confirm():
+    """The suite does not drop the tables of a database without --confirm."""
+    result = CliRunner().invoke(suite, ["--postgres", "postgresql://nohost/nodb"])
+
+    assert result.exit_code == 2
+    assert "add --confirm" in result.output
+    assert "dropping" not in result.output
+
+
+def test_bulk_load_postgres_needs_confirm():
+    """The bulk load does not drop the message table without --confirm."""
+    result = CliRunner().invoke(bulk_load, ["--postgres", "postgresql://nohost/nodb"])
+
+    assert result.exit_code == 2
+    assert "add --confirm" in result.output
+    assert "dropping" not in result.output
@@ -0,0 +1,125 @@
+# -*- coding: utf-8 -*-
+"""Test the identity cache behind SurrogatePK.get_by_id."""
+# pylint: disable=redefined-outer-name
+import pytest
+from sqlalchemy import create_engine, update
+from sqlalchemy.orm import Session
+
+from fm_database.base import get_base, session_scope
+from fm_database.cache import IdentityCache, configure_identity_cache
+from fm_database.models.device import Device
+
+from .factories import DeviceFactory
+
+
+@pytest.fixture()
+def cache():
+    """Enable the identity cache for a test."""
+    yield configure_identity_cache(maxsize=10)
+    configure_identity_cache(maxsize=0)
+
+
+def test_lru_eviction():
+    """The least recently used entry is evicted first."""
+    identity_cache = IdentityCache(maxsize=2)
+    for key in ("a", "b"):
+        identity_cache.set(key, {"id": key}, identity_cache.generation)
+    identity_cache.get("a")
+    identity_cache.set("c", {"id": "c"}, identity_cache.generation)
+
+    assert identity_cache.get("b") is None
+    assert identity_cache.get("a") == {"id": "a"}
+    assert identity_cache.stats()["size"] == 2
+
+
+def test_ttl_expiry():
+    """Entries are not returned once they expire."""
+    identity_cache = IdentityCache(ttl=-1)
+    identity_cache.set("a", {"id": "a"}, identity_cache.generation)
+
+    assert identity_cache.get("a") is None
+    assert identity_cache.stats()["misses"] == 1
+
+
+def test_stale_set_is_ignored():
+    """Values loaded before an invalidation are not stored."""
+    identity_cache = IdentityCache()
+    generation = identity_cache.generation
+    identity_cache.invalidate("a")
+    identity_cache.set("a", {"id": "a"}, generation)
+
+    assert identity_cache.get("a") is None
+
+
+@pytest.mark.usefixtures("committed_tables")
+class TestGetByIdCache:
+    """get_by_id identity cache tests."""
+
+    @staticmethod
+    def _create_device(dbsession):
+        """Create a device and return its id."""
+        device = DeviceFactory.create(dbsession)
+        device.save(dbsession)
+        return device.id
+
+    def test_hit_across_sessions(self, dbsession, cache):
+        """A record loaded in one session is served from the cache in another."""
+        device_id = self._create_device(dbsession)
+
+        with session_scope() as session:
+            first = Device.get_by_id(device_id, session)
+            assert cache.stats()["misses"] == 1
+        with session_scope() as session:
+            second = Device.get_by_id(device_id, session)
+            assert second is not first
+            assert second in session
+            assert second.device_id == first.device_id
+            assert cache.stats()["hits"] == 1
+
+    def test_save_invalidates(self, dbsession, cache):
+        """Saving a record removes it from the cache."""
+        device_id = self._create_device(dbsession)
+        with session_scope() as session:
+            Device.get_by_id(device_id, session)
+
+        with session_scope() as session:
+            Device.get_by_id(device_id, session).update(session, name="renamed")
+        with session_scope() as session:
+            assert Device.get_by_id(device_id, session).name == "renamed"
+        assert cache.stats()["misses"] == 2
+
+    def test_bulk_update_invalidates(self, dbsession, cache):
+        """UPDATE statements executed by a session remove the table's records."""
+        device_id = self._create_device(dbsession)
+        with session_scope() as session:
+            Device.get_by_id(device_id, session)
+
+        with session_scope() as session:
+            session.execute(update(Device).values(name="bulk"))
+            session.commit()
+        with session_scope() as session:
+            assert Device.get_by_id(device_id, session).name == "bulk"
+        assert cache.stats()["size"] == 1
+
+    def test_uncommitted_writes_are_not_cached(self, dbsession, cache):
+        """Records loaded after a flush in the same transaction are not cached."""
+        device_id = self._create_device(dbsession)
+
+        with session_scope() as session:
+            session.add(Device("other", "v1", "v1"))
+            session.flush()
+            Device.get_by_id(device_id, session)
+        assert cache.stats()["size"] == 0
+
+    def test_databases_do_not_share_entries(self, dbsession, cache):
+        """A record cached from one database is not served for another."""
+        device_id = self._create_device(dbsession)
+        with session_scope() as session:
+            Device.get_by_id(device_id, session)
+
+        engine = create_engine("sqlite://")
+        get_base().metadata.create_all(engine, tables=[Device.__table__])
+        with Session(bind=engine) as session:
+            assert Device.get_by_id(device_id, session) is None
+        engine.dispose()
+        assert cache.stats()["hits"] == 0
@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Test the command line interface start up."""
+import subprocess
+import sys
+
+from click.testing import CliRunner
+
+from fm_database.cli.cli import entry_point
+
+
+def import_times(statement):
+    """Return the cumulative import time in microseconds of each module.
+
+    The statement runs in a new interpreter with python -X importtime.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        check=True,
+        text=True,
+    )
+    times = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, module = line.partition(":")[2].split("|")
+        times[module.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_import_is_lazy():
+    """The CLI entry point does not import the commands, models or alembic."""
+    times = import_times("import fm_database.cli.cli")
+
+    assert "fm_database.cli.cli" in times
+    for module in (
+        "alembic",
+        "sqlalchemy",
+        "fm_database.models.device",
+        "fm_database.cli.testing.commands",
+    ):
+        assert module not in times
+
+
+def test_model_import_creates_no_engine():
+    """Importing the models does not create an engine or session."""
+    times = import_times(
+        "import fm_database.models.device, fm_database.base as base; "
+        "assert not base._registry"
+    )
+
+    assert "fm_database.models.device" in times
+
+
+def test_lazy_subcommands():
+    """Every subcommand is listed and loaded when it is used."""
+    result = CliRunner().invoke(entry_point, ["--help"])
+
+    assert result.exit_code == 0
+    for name in ("benchmark", "create", "export", "import", "lint", "test", "update"):
+        assert name in result.output
+    assert entry_point.get_command(None, "create").name == "create"
+    assert entry_point.get_command(None, "nope") is None
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Test the payload codecs."""
+import datetime as dt
+import uuid
+
+import pytest
+from sqlalchemy import LargeBinary
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.dialects.postgresql import JSONB
+
+from fm_database import codecs
+from fm_database.codecs import (
+    CODECS,
+    COMPRESSIONS,
+    PayloadType,
+    decode_payload,
+    encode_payload,
+    msgpack,
+    zstandard,
+)
+from fm_database.settings import TestConfig
+
+PAYLOAD = {"device_id": "device1", "values": [20.5, 21.0, None], "ok": True}
+
+
+@pytest.mark.parametrize("codec", list(CODECS))
+@pytest.mark.parametrize("compression", list(COMPRESSIONS))
+def test_round_trip(codec, compression):
+    """Every codec and compression decodes back to the same value."""
+    if codec == "msgpack" and msgpack is None:
+        pytest.skip("msgpack is not installed")
+    if compression == "zstd" and zstandard is None:
+        pytest.skip("zstandard is not installed")
+
+    data = encode_payload(PAYLOAD, codec, compression, threshold=0)
+
+    assert decode_payload(data) == PAYLOAD
+
+
+def test_compression_threshold():
+    """Only payloads over the threshold are compressed."""
+    small = encode_payload(PAYLOAD, "json", "zlib", threshold=1024)
+    large = encode_payload({"data": "x" * 2000}, "json", "zlib", threshold=1024)
+
+    assert small[0] & 0x0F == 0
+    assert large[0] & 0x0F == COMPRESSIONS["zlib"][0]
+    assert len(large) < 2000
+    assert decode_payload(large) == {"data": "x" * 2000}
+
+
+def test_payload_type_options():
+    """Unknown codecs and compressions are rejected."""
+    assert PayloadType(compression=None).compression is None
+    with pytest.raises(ValueError):
+        PayloadType(codec="pickle")
+    with pytest.raises(ValueError):
+        PayloadType(compression="lzma")
+
+
+def test_payload_type_storage(monkeypatch):
+    """Only jsonb columns are JSONB on Postgres, whatever the codec config."""
+    dialect = postgresql.dialect()
+    monkeypatch.setattr(TestConfig, "MESSAGE_PAYLOAD_CODEC", "msgpack")
+
+    payload_type = PayloadType(jsonb=True)
+    assert payload_type.codec == "msgpack"
+    assert isinstance(payload_type.load_dialect_impl(dialect), JSONB)
+    assert payload_type.process_bind_param(PAYLOAD, dialect) == PAYLOAD
+    assert isinstance(
+        PayloadType(codec="msgpack").load_dialect_impl(dialect), LargeBinary
+    )
+    with pytest.raises(ValueError):
+        PayloadType(codec="msgpack", jsonb=True)
+
+
+def test_payload_type_threshold():
+    """A threshold of 0 compresses every payload."""
+    payload_type = PayloadType(codec="json", compression="zlib", threshold=0)
+
+    data = payload_type.process_bind_param({"a": 1}, postgresql.dialect())
+    assert payload_type.threshold == 0
+    assert data[0] & 0x0F == COMPRESSIONS["zlib"][0]
+
+
+def test_json_without_orjson(monkeypatch):
+    """The json codec accepts the same values with and without orjson."""
+    value = {
+        1: dt.datetime(2021, 1, 1, 10, 0, 30, 500),
+        "day": dt.date(2021, 1, 1),
+        "id": uuid.UUID(int=1),
+    }
+    expected = {
+        "1": "2021-01-01T10:00:30.000500",
+        "day": "2021-01-01",
+        "id": "00000000-0000-0000-0000-000000000001",
+    }
+    assert decode_payload(encode_payload(value)) == expected
+
+    monkeypatch.setattr(codecs, "orjson", None)
+    assert decode_payload(encode_payload(value)) == expected
+    with pytest.raises(TypeError):
+        encode_payload({"a": object()})
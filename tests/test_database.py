@@ -0,0 +1,158 @@
+# -*- coding: utf-8 -*-
+"""Test the CRUDMixin and SurrogatePK helpers."""
+import pytest
+from sqlalchemy import event
+
+from fm_database import database
+from fm_database.base import get_engine
+from fm_database.database import chunked
+from fm_database.models.device import Device
+from fm_database.models.user import Role
+
+
+def test_chunked():
+    """Iterables are split into lists of at most the given size."""
+    assert list(chunked(range(5), 2)) == [[0, 1], [2, 3], [4]]
+    assert list(chunked([], 2)) == []
+
+
+def _device_rows(count, name="bulk"):
+    """Return rows of device column values."""
+    return [
+        {
+            "device_id": f"device{n}",
+            "name": name,
+            "hardware_version": "1",
+            "software_version": "1",
+        }
+        for n in range(count)
+    ]
+
+
+@pytest.mark.usefixtures("tables")
+class TestBulk:
+    """Bulk insert and upsert tests."""
+
+    @staticmethod
+    def test_bulk_create(dbsession):
+        """Insert many rows in batches."""
+        result = Device.bulk_create(dbsession, _device_rows(5), batch_size=2)
+
+        assert result is None
+        assert dbsession.query(Device).count() == 5
+
+    @staticmethod
+    def test_bulk_create_returning(dbsession):
+        """Primary keys are returned in the order of the rows."""
+        ids = Device.bulk_create(
+            dbsession, iter(_device_rows(5)), returning=True, batch_size=2
+        )
+
+        assert len(ids) == 5
+        for n, record_id in enumerate(ids):
+            assert Device.get_by_id(record_id).device_id == f"device{n}"
+
+    @staticmethod
+    def test_bulk_copy_falls_back(dbsession):
+        """Without Postgres rows are loaded with executemany."""
+        count = Device.bulk_copy(dbsession, iter(_device_rows(5)), batch_size=2)
+
+        assert count == 5
+        assert dbsession.query(Device).count() == 5
+
+    @staticmethod
+    def test_bulk_upsert(dbsession):
+        """Existing rows are updated and new rows are inserted."""
+        first_ids = Device.bulk_create(dbsession, _device_rows(3), returning=True)
+
+        ids = Device.bulk_upsert(
+            dbsession,
+            _device_rows(5, name="upserted"),
+            ["device_id"],
+            returning=True,
+        )
+        dbsession.expire_all()
+
+        assert ids[:3] == first_ids
+        assert dbsession.query(Device).count() == 5
+        assert {device.name for device in dbsession.query(Device)} == {"upserted"}
+
+    @staticmethod
+    def test_bulk_upsert_do_nothing(dbsession):
+        """Conflicting rows are skipped when only conflict columns are given."""
+        Role.bulk_create(dbsession, [{"name": "admin"}])
+
+        Role.bulk_upsert(dbsession, [{"name": "admin"}, {"name": "user"}], ["name"])
+
+        assert dbsession.query(Role).count() == 2
+
+    @staticmethod
+    def test_bulk_upsert_do_nothing_returning(dbsession):
+        """The primary keys of skipped rows are returned too."""
+        admin_id = Role.bulk_create(dbsession, [{"name": "admin"}], returning=True)[0]
+
+        ids = Role.bulk_upsert(
+            dbsession,
+            [{"name": "user"}, {"name": "admin"}],
+            ["name"],
+            returning=True,
+        )
+
+        assert len(ids) == 2
+        assert ids[1] == admin_id
+        assert Role.get_by_id(ids[0]).name == "user"
+
+    @staticmethod
+    def test_bulk_upsert_repeated_keys(dbsession):
+        """Rows of a batch with the same conflict values are updated with the last."""
+        rows = _device_rows(2)
+        rows.append({**rows[0], "name": "last"})
+
+        ids = Device.bulk_upsert(dbsession, rows, ["device_id"], returning=True)
+        dbsession.expire_all()
+
+        assert dbsession.query(Device).count() == 2
+        assert ids[0] == ids[2]
+        assert Device.get_by_id(ids[0]).name == "last"
+
+
+@pytest.mark.usefixtures("tables")
+class TestGetByIds:
+    """SurrogatePK.get_by_ids tests."""
+
+    @staticmethod
+    def test_get_by_ids(dbsession):
+        """Records are returned in input order with None for misses."""
+        ids = Device.bulk_create(dbsession, _device_rows(3), returning=True)
+
+        records = Device.get_by_ids([ids[2], str(ids[0]), 999, "bad", float(ids[2])])
+
+        assert [record and record.id for record in records] == [
+            ids[2],
+            ids[0],
+            None,
+            None,
+            ids[2],
+        ]
+        assert records[0] is records[4]
+
+    @staticmethod
+    def test_get_by_ids_chunks(dbsession, monkeypatch):
+        """Only records missing from the session are queried, in chunks."""
+        ids = Device.bulk_create(dbsession, _device_rows(5), returning=True)
+        loaded = Device.get_by_id(ids[0], dbsession)
+        monkeypatch.setitem(database.MAX_BIND_PARAMS, "sqlite", 2)
+        statements = []
+
+        def count(*args):  # pylint: disable=unused-argument
+            statements.append(args[2])
+
+        event.listen(get_engine(), "before_cursor_execute", count)
+        try:
+            records = Device.get_by_ids(ids, dbsession)
+        finally:
+            event.remove(get_engine(), "before_cursor_execute", count)
+
+        assert [record.id for record in records] == ids
+        assert records[0] is loaded
+        assert len(statements) == 2
@@ -0,0 +1,76 @@
+# -*- coding: utf-8 -*-
+"""Test the index advisor."""
+import pytest
+from click.testing import CliRunner
+from sqlalchemy import Column, ForeignKey, Integer, MetaData, String, Table
+
+from fm_database.base import get_base
+from fm_database.cli.database.commands import index_advisor
+from fm_database.indexes import (
+    is_indexed,
+    missing_filter_indexes,
+    missing_fk_indexes,
+)
+
+# import the models so their tables are in the metadata
+from fm_database.models import device, message, system, user  # noqa: F401
+
+
+def _metadata():
+    """Return metadata with indexed and unindexed foreign keys."""
+    metadata = MetaData()
+    Table("parent", metadata, Column("id", Integer, primary_key=True))
+    Table(
+        "child",
+        metadata,
+        Column("id", Integer, primary_key=True),
+        Column("name", String(10)),
+        Column("parent_id", Integer, ForeignKey("parent.id")),
+        Column("other_id", Integer, ForeignKey("parent.id"), index=True),
+    )
+    Table(
+        "link",
+        metadata,
+        Column("parent_id", Integer, ForeignKey("parent.id"), primary_key=True),
+        Column("child_id", Integer, ForeignKey("child.id"), primary_key=True),
+    )
+    return metadata
+
+
+def test_missing_fk_indexes():
+    """Foreign keys are covered by indexes and keys that start with them."""
+    assert missing_fk_indexes(_metadata()) == [
+        ("child", ("parent_id",), "parent"),
+        ("link", ("child_id",), "child"),
+    ]
+
+
+def test_missing_filter_indexes():
+    """Filter columns without an index are reported and unknown columns rejected."""
+    metadata = _metadata()
+
+    assert missing_filter_indexes(metadata, ["child.name", "child.other_id"]) == [
+        "child.name"
+    ]
+    assert is_indexed(metadata.tables["link"], ["child_id", "parent_id"])
+    for name in ("child", "missing.name", "child.nope"):
+        with pytest.raises(ValueError, match=name):
+            missing_filter_indexes(metadata, [name])
+
+
+def test_models_are_indexed():
+    """Every foreign key and hot filter column of the models has an index."""
+    metadata = get_base().metadata
+
+    assert missing_fk_indexes(metadata) == []
+    assert missing_filter_indexes(metadata) == []
+
+
+def test_index_advisor_rejects_unknown_columns():
+    """The command fails with a usage error for a --column it does not know."""
+    for name in ("device", "device.nope"):
+        result = CliRunner().invoke(index_advisor, ["-c", name])
+
+        assert result.exit_code == 2
+        assert f"Unknown column '{name}'" in result.output
+        assert "foreign keys" not in result.output
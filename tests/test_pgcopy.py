@@ -0,0 +1,68 @@
+# -*- coding: utf-8 -*-
+"""Test the COPY text format helpers."""
+import datetime as dt
+
+import pytest
+from sqlalchemy import Column, LargeBinary, MetaData, Table, create_engine
+from sqlalchemy.dialects.postgresql import psycopg2
+
+from fm_database.codecs import PayloadType, decode_payload
+from fm_database.models.message import Message
+from fm_database.pgcopy import RowReader, copy_lines, format_value
+
+
+def test_format_value():
+    """Values are formatted and escaped for the COPY text format."""
+    assert format_value(None) == r"\N"
+    assert format_value(True) == "t"
+    assert format_value("a\tb\nc\\") == r"a\tb\nc\\"
+    assert format_value(b"\x01\xff") == r"\\x01ff"
+    assert format_value(dt.timedelta(minutes=1)) == "60.0 seconds"
+    assert format_value(dt.datetime(2021, 1, 1, 10)) == "2021-01-01T10:00:00"
+    assert format_value(1.5) == "1.5"
+
+
+def test_row_reader():
+    """Lines are read in pieces of the requested size."""
+    reader = RowReader(["abc\n", "de\n", "f\n"])
+
+    assert reader.read(4) == "abc\n"
+    assert reader.read(2) == "de"
+    assert reader.read() == "\nf\n"
+    assert reader.read(10) == ""
+
+
+def test_copy_lines():
+    """Rows are bound with the column types and column defaults are applied."""
+    lines = copy_lines(
+        Message.__table__,
+        ["source", "payload"],
+        [{"source": "device1", "payload": {"a": 1}}, {"source": None, "payload": None}],
+        psycopg2.dialect(),
+        {"attempts": lambda: 0},
+    )
+
+    assert list(lines) == ['device1\t{"a": 1}\t0\n', "\\N\t\\N\t0\n"]
+
+
+def test_copy_lines_binary():
+    """Binary values bound by psycopg2 are written as bytea, not SQL literals."""
+    pytest.importorskip("psycopg2")
+    dialect = create_engine("postgresql+psycopg2://").dialect
+    table = Table(
+        "binary",
+        MetaData(),
+        Column("data", LargeBinary),
+        Column("payload", PayloadType(codec="msgpack", compression=None)),
+    )
+
+    (line,) = copy_lines(
+        table,
+        ["data", "payload"],
+        [{"data": b"\x00\x01", "payload": {"a": 1}}],
+        dialect,
+    )
+
+    data, payload = line.rstrip("\n").split("\t")
+    assert data == r"\\x0001"
+    assert decode_payload(bytes.fromhex(payload[3:])) == {"a": 1}
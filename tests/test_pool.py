@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Test the connection pool profile and statistics."""
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool
+
+from fm_database.pool import (
+    PoolStatistics,
+    TimedQueuePool,
+    get_engine_options,
+    get_pool_status,
+)
+from fm_database.settings import ProdConfig, TestConfig
+
+
+class QueueSqliteConfig(TestConfig):  # pylint: disable=too-few-public-methods
+    """A sqlite config that uses a queue pool."""
+
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    SQLALCHEMY_SQLITE_POOL = "queue"
+    SQLALCHEMY_POOL_SIZE = 1
+    SQLALCHEMY_MAX_OVERFLOW = 0
+    SQLALCHEMY_POOL_TIMEOUT = 0.01
+
+
+def test_postgres_engine_options():
+    """The prod config uses a queue pool sized from the config."""
+    options = get_engine_options(ProdConfig)
+
+    assert options["poolclass"] is TimedQueuePool
+    assert options["pool_size"] == ProdConfig.SQLALCHEMY_POOL_SIZE
+    assert options["max_overflow"] == ProdConfig.SQLALCHEMY_MAX_OVERFLOW
+    assert options["pool_recycle"] == ProdConfig.SQLALCHEMY_POOL_RECYCLE
+    assert options["pool_pre_ping"] is True
+
+
+def test_sqlite_engine_options():
+    """The sqlite pool is picked from the config."""
+
+    class NullSqliteConfig(TestConfig):  # pylint: disable=too-few-public-methods
+        """A sqlite config that uses a null pool."""
+
+        SQLALCHEMY_SQLITE_POOL = "null"
+
+    assert get_engine_options(NullSqliteConfig)["poolclass"] is NullPool
+    assert "pool_size" not in get_engine_options(NullSqliteConfig)
+
+
+def test_unknown_sqlite_pool():
+    """An unknown sqlite pool name raises an error."""
+
+    class BadConfig(TestConfig):  # pylint: disable=too-few-public-methods
+        """A config with an unknown pool."""
+
+        SQLALCHEMY_SQLITE_POOL = "unknown"
+
+    with pytest.raises(ValueError):
+        get_engine_options(BadConfig)
+
+
+def test_pool_statistics():
+    """Checkouts, waits and timeouts are counted."""
+    engine = create_engine(
+        QueueSqliteConfig.SQLALCHEMY_DATABASE_URI,
+        **get_engine_options(QueueSqliteConfig),
+    )
+    statistics = PoolStatistics()
+    statistics.attach(engine)
+    engine.pool.statistics = statistics
+
+    with engine.connect():
+        status = get_pool_status(engine, statistics)
+        assert status["pool"] == "TimedQueuePool"
+        assert status["checked_out"] == 1
+        assert status["overflow"] == 0
+
+        with pytest.raises(PoolTimeoutError):
+            engine.connect()
+
+    status = get_pool_status(engine, statistics)
+    assert status["checked_out"] == 0
+    assert status["checkouts"] == 1
+    assert status["connects"] == 1
+    assert status["timeouts"] == 1
+    assert status["max_wait"] > 0
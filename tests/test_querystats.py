@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Test the statement statistics and slow query log."""
+import logging
+import threading
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import OperationalError
+
+from fm_database.base import (
+    dispose_engine,
+    get_engine,
+    query_statistics,
+    session_scope,
+)
+from fm_database.querystats import QueryStatistics, count_queries, fingerprint
+from fm_database.settings import TestConfig
+
+
+class StatsConfig(TestConfig):  # pylint: disable=too-few-public-methods
+    """A config that collects statement statistics."""
+
+    SQLALCHEMY_DATABASE_URI = "sqlite://"
+    SQLALCHEMY_SQLITE_POOL = "static"
+    QUERY_STATS = True
+
+
+def test_fingerprint():
+    """Whitespace and placeholder lists are collapsed."""
+    assert fingerprint("SELECT a\n  FROM t WHERE id IN (?, ?, ?)") == (
+        "SELECT a FROM t WHERE id IN (?, ...)"
+    )
+    assert fingerprint("SELECT a FROM t WHERE id IN (%(id_1_1)s, %(id_1_2)s)") == (
+        "SELECT a FROM t WHERE id IN (?, ...)"
+    )
+    assert fingerprint("SELECT a FROM t WHERE id = ?") == (
+        "SELECT a FROM t WHERE id = ?"
+    )
+
+
+def test_statistics():
+    """Executions are counted per fingerprint with their latency and rows."""
+    engine = create_engine("sqlite://")
+    statistics = QueryStatistics()
+    statistics.attach(engine)
+    with engine.begin() as connection:
+        connection.execute(text("CREATE TABLE t (id INTEGER)"))
+        connection.execute(text("INSERT INTO t VALUES (1), (2), (3)"))
+        for _ in range(3):
+            connection.execute(text("UPDATE t SET id = id + 1 WHERE id > 1"))
+        with pytest.raises(OperationalError):
+            connection.execute(text("SELECT nope FROM t"))
+        assert not connection.info["query_start_time"]
+    statistics.detach(engine)
+    engine.dispose()
+
+    counters = statistics.as_dict()["UPDATE t SET id = id + 1 WHERE id > 1"]
+    assert counters["count"] == 3
+    assert counters["rows"] == 6
+    assert 0 < counters["avg"] <= counters["p99"]
+    assert statistics.top(1, "count")[0][0] == "UPDATE t SET id = id + 1 WHERE id > 1"
+
+
+def test_slow_query_log(caplog):
+    """Statements slower than the threshold are logged."""
+    statistics = QueryStatistics(slow_seconds=0.5)
+
+    with caplog.at_level(logging.WARNING, logger="fm_database.querystats"):
+        statistics.record("SELECT 1", 0.1)
+        statistics.record("SELECT 2", 0.6)
+
+    assert [record.getMessage() for record in caplog.records] == [
+        "slow query (0.600s): SELECT 2"
+    ]
+
+
+def test_dump_adds_up(tmp_path):
+    """Dumping to an existing file adds the counters to the stored ones."""
+    path = tmp_path / "queries.json"
+    statistics = QueryStatistics()
+    statistics.record("SELECT 1", 0.1, rows=1)
+    statistics.dump(path)
+    statistics.dump(path)
+
+    stored = QueryStatistics()
+    stored.load(path)
+    counters = stored.as_dict()["SELECT 1"]
+    assert counters["count"] == 2
+    assert counters["rows"] == 2
+    assert counters["total"] == pytest.approx(0.2)
+
+
+def test_concurrent_dumps(tmp_path):
+    """Dumps that run at the same time do not lose counters."""
+    path = tmp_path / "queries.json"
+    statistics = QueryStatistics()
+    statistics.record("SELECT 1", 0.1, rows=1)
+
+    def dump():
+        for _ in range(20):
+            statistics.dump(path)
+
+    threads = [threading.Thread(target=dump) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    stored = QueryStatistics()
+    stored.load(path)
+    assert stored.as_dict()["SELECT 1"]["count"] == 80
+
+
+def test_query_statistics_opt_in():
+    """Only configs that ask for statistics instrument their engine."""
+    assert query_statistics(TestConfig) is None
+
+    with get_engine(StatsConfig).connect() as connection:
+        connection.execute(text("SELECT 1"))
+    assert query_statistics(StatsConfig).as_dict()["SELECT 1"]["count"] == 1
+    dispose_engine(StatsConfig)
+
+
+def test_count_queries():
+    """Statements are counted by every active block."""
+    engine = create_engine("sqlite://")
+    with engine.connect() as connection:
+        with count_queries(engine) as outer:
+            connection.execute(text("SELECT 1"))
+            with count_queries(engine) as inner:
+                connection.execute(text("SELECT 2"))
+        connection.execute(text("SELECT 3"))
+    engine.dispose()
+
+    assert outer.statements == ["SELECT 1", "SELECT 2"]
+    assert inner.count == 1
+
+
+def test_assert_max_queries(assert_max_queries):
+    """Going over the number of statements fails with the statements."""
+    with assert_max_queries(1):
+        with session_scope() as session:
+            session.execute(text("SELECT 1"))
+
+    with pytest.raises(AssertionError, match="SELECT 2"):
+        with assert_max_queries(1):
+            with session_scope() as session:
+                session.execute(text("SELECT 1"))
+                session.execute(text("SELECT 2"))
+
+
+def test_session_scope_budget(caplog):
+    """A session scope over its budget logs a warning."""
+    with caplog.at_level(logging.WARNING, logger="fm_database.querystats"):
+        with session_scope(max_queries=1) as session:
+            session.execute(text("SELECT 1"))
+        with session_scope(max_queries=1) as session:
+            session.execute(text("SELECT 1"))
+            session.execute(text("SELECT 2"))
+
+    assert [record.getMessage() for record in caplog.records] == [
+        "session scope executed 2 statements, over its budget of 1"
+    ]
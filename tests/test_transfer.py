@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+"""Test the table export and import."""
+import datetime as dt
+
+import pytest
+
+from fm_database import transfer
+from fm_database.base import get_engine
+from fm_database.models.device import Device
+from fm_database.models.message import Message
+from fm_database.transfer import export_table, get_tables, import_table, table_path
+
+
+def test_get_tables():
+    """Tables are returned parents first and unknown names are rejected."""
+    names = [table.name for table in get_tables(["grainbin", "device"])]
+
+    assert names == ["device", "grainbin"]
+    with pytest.raises(ValueError):
+        get_tables(["nope"])
+
+
+@pytest.mark.usefixtures("committed_tables")
+@pytest.mark.parametrize("fmt", transfer.FORMATS)
+def test_round_trip(dbsession, tmp_path, fmt):
+    """Exported rows are imported with the same values."""
+    if fmt == "parquet" and transfer.pyarrow is None:
+        pytest.skip("pyarrow is not installed")
+    device = Device("export", "1", "1")
+    device.uptime = dt.timedelta(hours=1, seconds=5)
+    device.connected = True
+    device.save(dbsession)
+    for n in range(3):
+        Message.enqueue(dbsession, "Source", "Destination", "Test", payload={"n": n})
+    Message.enqueue(dbsession, "Source", "Destination", "Test", payload="text")
+    Message.enqueue(dbsession, "Source", "Destination", "Test")
+    tables = get_tables(["device", "message"])
+    dbsession.close()
+
+    with get_engine().connect() as connection:
+        counts = [
+            export_table(
+                connection, table, table_path(tmp_path, table, fmt), fmt, batch_size=2
+            )
+            for table in tables
+        ]
+    with get_engine().begin() as connection:
+        for table in reversed(tables):
+            connection.execute(table.delete())
+        imported = [
+            import_table(
+                connection, table, table_path(tmp_path, table, fmt), fmt, batch_size=2
+            )
+            for table in tables
+        ]
+
+    assert counts == imported == [1, 5]
+    device = dbsession.query(Device).one()
+    assert device.device_id == "export"
+    assert device.uptime == dt.timedelta(hours=1, seconds=5)
+    assert device.connected is True
+    assert isinstance(device.creation_time, dt.datetime)
+    messages = dbsession.query(Message).order_by(Message.id).all()
+    assert [message.payload for message in messages] == [
+        {"n": 0},
+        {"n": 1},
+        {"n": 2},
+        "text",
+        None,
+    ]